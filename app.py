@@ -1,454 +1,280 @@
 # app.py  – 2-week auto-campaign + comment hunter
-import os, json, time, sqlite3, schedule, threading, requests
+import time
+_script_started = time.perf_counter()
+import os
 from datetime import datetime, timedelta, timezone
-from openai import OpenAI
-import tweepy, praw
-import streamlit as st
+import startup
+
+# SDKs (tweepy, praw) are imported by clients.py in the worker, on first use;
+# everything below is cheap after the first run because modules stay cached.
+with startup.timed("streamlit"):
+    import streamlit as st
 
 # --------------------------------------------------
-# 0.  ENV / SECRETS  (never commit to git)
+# 0.  ENV / SECRETS  (loaded once in config.py, never commit to git)
 # --------------------------------------------------
-from dotenv import load_dotenv
-import pathlib
-# Load .env from .streamlit if present
-dotenv_path = pathlib.Path(__file__).parent / ".." / ".streamlit" / ".env"
-if dotenv_path.exists():
-    load_dotenv(dotenv_path)
-else:
-    load_dotenv()
-
-# Only use os.getenv for all posting keys
-GROQ_KEY        = os.getenv("GROQ_KEY") or os.getenv("GROQAPI_KEY")
-OPENROUTER_KEY  = os.getenv("OPENROUTER_KEY")
-GEMINI_API_KEY  = os.getenv("GEMINI_API_KEY")
-TW_API_KEY      = os.getenv("TW_API_KEY")
-TW_API_SECRET   = os.getenv("TW_API_SECRET")
-TW_ACCESS       = os.getenv("TW_ACCESS")
-TW_ACCESS_SECRET= os.getenv("TW_ACCESS_SECRET")
-TW_BEARER       = os.getenv("TW_BEARER")
-CLIENT_ID       = os.getenv("CLIENT_ID")
-CLIENT_SECRET   = os.getenv("CLIENT_SECRET")
-REDDIT_CLIENT   = os.getenv("REDDIT_CLIENT")
-REDDIT_SECRET   = os.getenv("REDDIT_SECRET")
-REDDIT_USER     = os.getenv("REDDIT_USER")
-REDDIT_PW       = os.getenv("REDDIT_PW")
-REDDIT_UA       = os.getenv("REDDIT_UA")
-LINKEDIN_CLIENT = os.getenv("LINKEDIN_CLIENT")
-LINKEDIN_SECRET = os.getenv("LINKEDIN_SECRET")
-LINKEDIN_TOKEN  = os.getenv("LINKEDIN_TOKEN")
-WHATSAPP_TOKEN  = os.getenv("WHATSAPP_TOKEN")
-PRODUCT_URL     = os.getenv("PRODUCT_URL", "https://bit.ly/qorganizer")
-
-DB_FILE = "campaign.db"
-
-db_lock = threading.Lock()
+# config.py is pulled in by db.py below; the UI itself reads no settings.
 
 # --------------------------------------------------
-# DATABASE HELPER FUNCTIONS
+# DATABASE (pooled connections, see db.py)
 # --------------------------------------------------
-def get_db_connection():
-    """Get a database connection with proper timeout and WAL mode"""
-    conn = sqlite3.connect(DB_FILE, check_same_thread=False, timeout=30.0)
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA synchronous=NORMAL")
-    conn.execute("PRAGMA temp_store=memory")
-    conn.execute("PRAGMA mmap_size=268435456")  # 256MB
-    return conn
-
-def execute_db_query(query, params=None, fetch=False):
-    """Execute database query with proper locking and error handling"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            with db_lock:
-                conn = get_db_connection()
-                try:
-                    cursor = conn.cursor()
-                    if params:
-                        cursor.execute(query, params)
-                    else:
-                        cursor.execute(query)
-                    
-                    if fetch:
-                        result = cursor.fetchall()
-                    else:
-                        result = None
-                    
-                    conn.commit()
-                    return result
-                finally:
-                    conn.close()
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e) and attempt < max_retries - 1:
-                time.sleep(0.1 * (attempt + 1))  # Progressive backoff
-                continue
-            else:
-                raise e
-    return None
-
-# Ensure table exists at startup using helper function
-def init_database():
-    """Initialize database with proper error handling"""
-    try:
-        execute_db_query("""
-        CREATE TABLE IF NOT EXISTS posts(
-            id TEXT PRIMARY KEY,
-            platform TEXT,
-            text TEXT,
-            scheduled TEXT,
-            posted INTEGER DEFAULT 0,
-            permalink TEXT
-        )""")
-        return True
-    except Exception as e:
-        print(f"Database initialization error: {e}")
-        return False
+with startup.timed("db"):
+    from db import execute_db_query, init_database, pool_stats, to_epoch
+
 
-# Initialize database
-init_database()
+@st.cache_resource
+def database_ready():
+    """Run migrations once per process instead of on every rerun.
+    Raises on failure so a failed attempt isn't cached and the next rerun retries."""
+    if not init_database():
+        raise RuntimeError("Database initialization failed")
+    return True
+
+
+with startup.timed("init_database"):
+    database_ready()
 
 # --------------------------------------------------
-# 1.  GROQ LLM
+# 1.  GROQ LLM  (fallback chain lives in llm.py)
 # --------------------------------------------------
-# -------------------- LLM Fallback Logic --------------------
-FALLBACK_MODELS = [
-    # Compound models (Groq, rate-limited, not paywalled)
-    "compound-beta-kimi",
-    "compound-beta-mini",
-    "compound-beta",
-    # Fastest, direct Groq API models
-    "gemma-7b-it",
-    "llama3-8b-8192",
-    "mixtral-8x7b-32768",
-    "mistral-7b-instruct",
-    "llama-3.1-8b-instant"
-]
-
-def smart_chat(prompt, max_tokens=120):
-    # Try Groq API for all supported models
-    if GROQ_KEY:
-        for model in FALLBACK_MODELS:
-            try:
-                r = requests.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {GROQ_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": max_tokens
-                    },
-                    timeout=15
-                )
-                if r.status_code == 200:
-                    return r.json()["choices"][0]["message"]["content"].strip()
-            except Exception:
-                continue
-    # Try OpenRouter free models
-    if OPENROUTER_KEY:
-        for model in [
-            "google/gemma-2-9b-it:free",
-            "google/gemini-1.5-flash-latest:free",
-            "moonshotai/kimi-k2:free",
-            "mistralai/mistral-7b-instruct:free"
-        ]:
-            try:
-                r = requests.post(
-                    "https://openrouter.ai/api/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {OPENROUTER_KEY}",
-                        "HTTP-Referer": "https://kamandalabs.me"
-                    },
-                    json={
-                        "model": model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": max_tokens
-                    },
-                    timeout=15
-                )
-                if r.status_code == 200:
-                    return r.json()["choices"][0]["message"]["content"].strip()
-            except Exception:
-                continue
-    # Fallback to Gemini API if available
-    if GEMINI_API_KEY:
-        try:
-            gemini_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
-            r = requests.post(
-                gemini_url + f"?key={GEMINI_API_KEY}",
-                json={
-                    "contents": [{"parts": [{"text": prompt}]}],
-                    "generationConfig": {"maxOutputTokens": max_tokens}
-                },
-                timeout=15
-            )
-            if r.status_code == 200:
-                return r.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
-        except Exception:
-            pass
-    return "⚠️ All free models busy, please retry."
+with startup.timed("llm_cache+router"):
+    from llm_cache import llm_cache
+    from router import stored_health
 
 # --------------------------------------------------
-# 2.  PLATFORM CLIENTS
+# 2.  PLATFORM CLIENTS  (cached per credential set in clients.py)
 # --------------------------------------------------
-def twitter_client():
-    """Create Twitter client using API v1.1 (original working method)"""
-    auth = tweepy.OAuth1UserHandler(TW_API_KEY, TW_API_SECRET, TW_ACCESS, TW_ACCESS_SECRET)
-    return tweepy.API(auth)
-
-def reddit_client():
-    return praw.Reddit(
-        client_id=REDDIT_CLIENT,
-        client_secret=REDDIT_SECRET,
-        username=REDDIT_USER,
-        password=REDDIT_PW,
-        user_agent=REDDIT_UA
-    )
+# Built and used by the worker only; the UI never talks to the platforms.
 
 # --------------------------------------------------
-# 3.  2-WEEK CALENDAR (EXTENSIBLE)
+# 3.  2-WEEK CALENDAR (EXTENSIBLE, see generation.py)
 # --------------------------------------------------
-def get_plan():
-    # This could be loaded from a config/db in the future
-    platforms = [
-        {"platform": "x", "prompt": "Write a catchy 1-sentence tweet about messy downloads"},
-        {"platform": "reddit", "prompt": "150-word intro post for r/productivity", "sub": "productivity"},
-        {"platform": "linkedin", "prompt": "100-word LinkedIn post for freelancers"}
-    ]
-    plan = []
-    for day in range(14):
-        for i, p in enumerate(platforms):
-            entry = dict(p)
-            entry["day"] = day
-            # Spread posts throughout the day (every 8 hours)
-            entry["hour_offset"] = i * 8
-            plan.append(entry)
-    return plan
+# Generation, posting and replies run in the worker (python -m campaign worker);
+# this script only reads campaign.db and enqueues commands.
+with startup.timed("commands+worker"):
+    import commands
+    import posts_view
+    import lease
+    import worker
 
 # --------------------------------------------------
-# 5.  POSTER + COMMENT REPLIER (EXTENSIBLE)
+# 5.  POSTER + COMMENT REPLIER (EXTENSIBLE, poster in posting.py, replier in replier.py)
 # --------------------------------------------------
-# Initialize logs in session state
-if 'logs' not in st.session_state:
-    st.session_state['logs'] = []
+with startup.timed("ratelimit"):
+    from ratelimit import limiter
+    import metrics
 
-MAX_LOGS = 50  # Number of log entries to keep
+MAX_LOGS = 50  # Number of log entries to show
 
-# Thread-safe logging using file-based approach
-import threading
-log_lock = threading.Lock()
-
-def add_log(message):
-    """Thread-safe logging that works from background threads"""
-    timestamp = datetime.now(timezone.utc).isoformat(timespec='seconds')
-    log_entry = f"[{timestamp}] {message}"
-    
-    try:
-        # Try to update session state (works in main thread)
-        if hasattr(st, 'session_state'):
-            logs = st.session_state.get('logs', [])
-            logs.append(log_entry)
-            st.session_state['logs'] = logs[-MAX_LOGS:]
-    except:
-        # Fallback: write to file for background threads
-        with log_lock:
-            try:
-                with open("campaign_logs.txt", "a", encoding="utf-8") as f:
-                    f.write(log_entry + "\n")
-            except:
-                pass  # Ignore file write errors
-
-def load_logs_from_file():
-    """Load logs from file into session state"""
-    try:
-        if os.path.exists("campaign_logs.txt"):
-            with open("campaign_logs.txt", "r", encoding="utf-8") as f:
-                file_logs = f.readlines()
-            # Merge with session logs, avoiding duplicates
-            session_logs = st.session_state.get('logs', [])
-            all_logs = list(set(session_logs + [log.strip() for log in file_logs]))
-            all_logs.sort()  # Sort by timestamp
-            st.session_state['logs'] = all_logs[-MAX_LOGS:]
-    except:
-        pass
-
-def poster():
-    try:
-        now = datetime.now(timezone.utc).isoformat(timespec="minutes")
-        rows = execute_db_query("SELECT * FROM posts WHERE scheduled <= ? AND posted=0", (now,), fetch=True)
-        
-        if not rows:
-            st.session_state["last_posted"] = "No scheduled posts to send right now."
-            return
-            
-        posted_platforms = set()
-        for r in rows:
-            id_, plat, txt, _, _, _ = r
-            try:
-                if plat == "x":
-                    client = twitter_client()
-                    # Use Twitter API v2 for posting
-                    response = client.create_tweet(text=txt)
-                    tweet_id = response.data['id']
-                    execute_db_query(
-                        "UPDATE posts SET posted=1, permalink=? WHERE id=?", 
-                if plat == "x":
-                    api = twitter_client()
-                    # Use Twitter API v1.1 method (original working method)
-                    tweet = api.update_status(txt)
-                    execute_db_query(
-                        "UPDATE posts SET posted=1, permalink=? WHERE id=?", 
-                        (f"https://twitter.com/i/web/status/{tweet.id}", id_)
-                    )
-                    posted_platforms.add("X (Twitter)")
-                    add_log(f"Posted to X: {tweet.id}")
-                            "UPDATE posts SET posted=1, permalink=? WHERE id=?", 
-                            (post.url, id_)
-                        )
-                        posted_platforms.add(f"Reddit (r/{sub})")
-                        add_log(f"Posted to Reddit r/{sub}: {post.url}")
-                        
-                elif plat == "linkedin":
-                    headers = {"Authorization": f"Bearer {LINKEDIN_TOKEN}", "Content-Type": "application/json"}
-                    payload = {"author": "urn:li:person:me", "lifecycleState": "PUBLISHED",
-                               "specificContent": {"com.linkedin.ugc.ShareContent": {
-                                   "shareCommentary": {"text": txt}, "shareMediaCategory": "NONE"}},
-                               "visibility": {"com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"}}
-                    r = requests.post("https://api.linkedin.com/v2/ugcPosts", headers=headers, json=payload)
-                    if r.status_code == 201:
-                        execute_db_query("UPDATE posts SET posted=1 WHERE id=?", (id_,))
-                        posted_platforms.add("LinkedIn")
-                        add_log(f"Posted to LinkedIn: {id_}")
-                        
-            except Exception as e:
-                st.error(f"{plat} error: {e}")
-                add_log(f"Error posting to {plat}: {e}")
-                
-        # Show message in UI after posting
-        if posted_platforms:
-            st.session_state["last_posted"] = f"✅ Finished posting to: {', '.join(posted_platforms)}"
-            add_log(st.session_state["last_posted"])
-        else:
-            st.session_state["last_posted"] = "No posts were ready to send."
-            
-    except Exception as e:
-        error_msg = f"Error in poster function: {e}"
-        add_log(error_msg)
-        st.session_state["last_posted"] = f"❌ {error_msg}"
-
-def comment_replier():
-    try:
-        reddit = reddit_client()
-        for post in reddit.user.me().submissions.new(limit=10):
-            for comment in post.comments:
-                if comment.author and comment.author.name != REDDIT_USER and PRODUCT_URL not in comment.body:
-                    reply = smart_chat(f"Reply politely to Reddit comment: {comment.body}\nMention {PRODUCT_URL} in 1 sentence.")
-                    if reply:
-                        comment.reply(reply)
-                        add_log(f"Replied to Reddit comment {comment.id} on post {post.id}")
-                    time.sleep(2)  # avoid spam
-    except Exception as e:
-        add_log(f"Error in comment_replier: {e}")
-
-schedule.every(1).minutes.do(poster)
-schedule.every(10).minutes.do(comment_replier)
-
-# Background scheduler thread
-def run_scheduler():
-    """Run scheduler in background with error handling"""
-    import logging
-    logging.getLogger("streamlit").setLevel(logging.ERROR)  # Suppress ScriptRunContext warnings
-    
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(30)  # Check every 30 seconds
-        except Exception as e:
-            # Use print instead of add_log to avoid ScriptRunContext issues
-            print(f"[{datetime.utcnow().isoformat()}] Scheduler error: {e}")
-            time.sleep(60)  # Wait longer on error
+# Shared log (logs.py): every process appends to the rotated log file; the UI
+# tails it incrementally into a ring buffer shared by all sessions.
+from logs import add_log, recent_logs, tail as log_tail
+import events
 
 # --------------------------------------------------
 # 4.  UI
 # --------------------------------------------------
 st.title("🤖 Auto-Campaign for QuickOrganizer")
 
+fresh_variations = st.checkbox("Fresh variations (skip LLM cache)", value=False)
+
 if st.button("Generate & Schedule"):
     try:
-        plan = get_plan()
-        for p in plan:
-            text = smart_chat(p["prompt"] + f"\nEnd with link: {PRODUCT_URL}", max_tokens=120)
-            if not text: 
-                continue
-            
-            # Calculate schedule time with hour offset for better distribution
-            hour_offset = p.get("hour_offset", 0)
-            scheduled = (datetime.now(timezone.utc) + timedelta(days=p["day"], hours=hour_offset)).isoformat(timespec="minutes")
-            post_id = f"{p['platform']}_{p['day']}_{hour_offset}"
-            
-            # Use the new database helper function
-            execute_db_query(
-                "INSERT OR IGNORE INTO posts VALUES(?,?,?,?,0,'')",
-                (post_id, p["platform"], text, scheduled)
-            )
-        st.success("Posts queued!")
+        id_ = commands.enqueue("generate", fresh=fresh_variations)
+        st.success(f"Generation queued (command #{id_}); progress shows under Worker commands.")
+        add_log(f"Queued generation command #{id_}")
     except Exception as e:
-        st.error(f"Error generating posts: {e}")
-        add_log(f"Error generating posts: {e}")
+        st.error(f"Error queueing generation: {e}")
+        add_log(f"Error queueing generation: {e}")
 
+# Posts browser: one keyset page at a time, text preview only, cached until posts change
 try:
-    df = execute_db_query("SELECT id,platform,text,scheduled,posted FROM posts ORDER BY scheduled", fetch=True)
-    if df:
-        st.dataframe(df)
+    c_plat, c_status, c_from, c_to = st.columns(4)
+    post_filters = {
+        "platform": c_plat.selectbox("Platform", ("", "x", "reddit", "linkedin"), key="pv_platform") or None,
+        "status": c_status.selectbox("Status", ("all", "pending", "posted"), key="pv_status"),
+        "start": c_from.date_input("From", value=None, key="pv_from"),
+        "end": c_to.date_input("To", value=None, key="pv_to"),
+    }
+    if st.session_state.get("pv_filters") != post_filters:
+        st.session_state["pv_filters"] = post_filters
+        st.session_state["pv_cursors"] = [None]
+    query_filters = dict(post_filters,
+                         start=to_epoch(datetime.combine(post_filters["start"], datetime.min.time()))
+                         if post_filters["start"] else None,
+                         end=to_epoch(datetime.combine(post_filters["end"] + timedelta(days=1), datetime.min.time()))
+                         if post_filters["end"] else None)
+    pv_cursors = st.session_state["pv_cursors"]
+    c_prev, c_next = st.columns(2)
+    if c_prev.button("◀ Previous posts", disabled=len(pv_cursors) == 1):
+        pv_cursors.pop()
+    post_rows, post_next = posts_view.page(after=pv_cursors[-1], **query_filters)
+    if c_next.button("Next posts ▶", disabled=post_next is None):
+        pv_cursors.append(post_next)
+        post_rows, post_next = posts_view.page(after=pv_cursors[-1], **query_filters)
+    if post_rows:
+        st.dataframe([dict(zip(posts_view.COLUMNS, r)) for r in post_rows])
+        expand_id = st.selectbox("Show full text of", [""] + [r[0] for r in post_rows], key="pv_expand")
+        if expand_id:
+            st.text_area("Full text", posts_view.full_text(expand_id) or "", height=150, disabled=True)
     else:
         st.info("No posts scheduled yet.")
 except Exception as e:
     st.error(f"Error loading posts: {e}")
     add_log(f"Error loading posts: {e}")
 
-# Initialize scheduler thread as daemon
-if 'scheduler_started' not in st.session_state:
-    st.session_state['scheduler_started'] = False
+col_post, col_reply = st.columns(2)
+if col_post.button("Post due now"):
+    st.info(f"Queued post run (command #{commands.enqueue('post_now')})")
+if col_reply.button("Reply to comments now"):
+    st.info(f"Queued replier run (command #{commands.enqueue('reply_now')})")
 
+# Without a separate `python -m campaign worker`, run one inside this process.
+# Only the lease holder schedules; extra workers (other tabs, hosts) observe.
 if st.button("Start scheduler"):
-    if not st.session_state['scheduler_started']:
-        poster()  # Immediately process any due posts
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
-        st.session_state['scheduler_started'] = True
-        st.info("Scheduler started! (runs in background)")
-        add_log("Scheduler started successfully")
+    running = worker.start_background()
+    st.info(f"Worker {running.id} running in this app (background thread)")
+    add_log("Scheduler started successfully")
+
+leader = lease.current(worker.SCHEDULER_LEASE)
+if leader and leader["alive"]:
+    st.caption(f"Scheduler leader: {leader['holder']} · heartbeat {int(time.time() - leader['heartbeat_at'])}s ago")
+else:
+    st.caption("No scheduler running. Start one here or with `python -m campaign worker`.")
+
+# The worker does the LLM, posting and DB work, so cache and pool counters come
+# from its metrics textfile (the leader's first); this process's are near zero.
+metric_files = metrics.worker_textfiles()
+leader_file = metrics.textfile_for(leader["holder"]) if leader else None
+if leader_file in metric_files:
+    metric_files.remove(leader_file)
+    metric_files.insert(0, leader_file)
+
+
+def read_textfile(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError:  # that worker stopped since the list was read
+        return ""
+
+
+worker_samples = metrics.parse(read_textfile(metric_files[0])) if metric_files else []
+
+
+def worker_stats(name, label="stat"):
+    """{label value: value} of one collected metric in the worker's textfile"""
+    return {labels.get(label): value for metric, labels, value in worker_samples if metric == name}
+
+with st.expander("⚙️ Worker commands", expanded=True):
+    recent = commands.recent()
+    if recent:
+        st.dataframe([dict(zip(("id", "command", "status", "progress", "result", "worker", "created_at"), r))
+                      for r in recent])
     else:
-        st.info("Scheduler is already running")
+        st.caption("No commands yet.")
 
-# Show last posting summary if available
-if "last_posted" in st.session_state:
-    st.success(st.session_state["last_posted"])
+with st.expander("🗄️ Database pool stats"):
+    if worker_samples:
+        st.caption(f"Worker ({metric_files[0]})")
+        st.json(worker_stats("campaign_db_pool"))
+    else:
+        st.caption("No worker metrics yet; this process")
+        st.json(pool_stats())
+
+with st.expander("🚦 Rate limits"):
+    st.json(limiter.snapshot())
+
+with st.expander("💬 Comment replier"):
+    st.json(execute_db_query(
+        "SELECT action, COUNT(*) FROM seen_comments GROUP BY action", fetch=True) or {})
+    st.caption("Submissions tracked: " + str(execute_db_query(
+        "SELECT COUNT(*) FROM submission_marks", fetch=True)[0][0]))
+
+with st.expander("🧠 LLM model health"):
+    health = stored_health()
+    if health:
+        st.dataframe(health)
+    else:
+        st.caption("No LLM calls recorded yet.")
+    cache_stats = worker_stats("campaign_llm_cache_lookups_total", "result")
+    if cache_stats:
+        lookups = sum(cache_stats.get(k, 0) for k in ("hot_hits", "db_hits", "misses"))
+        hits = cache_stats.get("hot_hits", 0) + cache_stats.get("db_hits", 0)
+        st.caption(f"Response cache (worker) · hit rate {hits / lookups if lookups else 0.0:.1%}")
+        st.json(cache_stats)
+    else:
+        st.caption("Response cache (this process; no worker metrics yet)")
+        st.json(llm_cache.snapshot())
+
+with st.expander("📈 Metrics"):
+    # Each worker rewrites its own textfile every METRICS_INTERVAL_S, the
+    # scheduler leader's is listed first; "This process" is the UI's own numbers.
+    metrics_source = st.selectbox("Source", metric_files + ["This process"], key="metrics_source")
+    if metrics_source != "This process":
+        metrics_text = read_textfile(metrics_source)
+        st.caption(f"{metrics_source} · written {int(time.time() - os.path.getmtime(metrics_source))}s ago"
+                   if metrics_text else f"{metrics_source} is gone; its worker stopped.")
+    else:
+        metrics_text = metrics.registry.render()
+        st.caption("This process")
+    samples = metrics.parse(metrics_text)
+    if samples:
+        st.dataframe([{"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels.items()), "value": value}
+                      for name, labels, value in samples])
+    else:
+        st.caption("No metrics recorded yet.")
+    st.download_button("Download (Prometheus text)", metrics_text, file_name="campaign_metrics.prom")
 
 # Log panel UI
 st.markdown("### 📋 Background Log Panel")
 
-# Load any logs from background threads
-load_logs_from_file()
+st.button("Refresh logs")  # a rerun reads whatever was appended since the last one
 
-if st.button("Refresh logs"):
-    load_logs_from_file()  # Refresh from file
-    
 if st.button("Clear logs"):
-    st.session_state['logs'] = []
-    try:
-        os.remove("campaign_logs.txt")
-    except:
-        pass
+    # Hide what is there now; the file keeps its history (rotated by size/age)
+    log_tail.refresh()
+    st.session_state['logs_after'] = log_tail.seq
 
-current_logs = st.session_state.get('logs', [])
+current_logs = recent_logs(MAX_LOGS, after=st.session_state.get('logs_after', 0))
 if current_logs:
-    st.text_area("Logs (last 50 actions):", value="\n".join(current_logs[-MAX_LOGS:]), height=300)
+    st.text_area("Logs (last 50 actions):", value="\n".join(current_logs), height=300)
 else:
     st.info("No logs yet. Start the scheduler to see activity logs.")
 
+with st.expander("🔎 Event log"):
+    c_kind, c_plat, c_status = st.columns(3)
+    ev_filters = {
+        "kind": c_kind.selectbox("Kind", ("",) + events.KINDS, key="ev_kind"),
+        "platform": c_plat.text_input("Platform / provider", key="ev_platform").strip() or None,
+        "status": c_status.selectbox("Status", ("",) + events.STATUSES, key="ev_status"),
+    }
+    # Stack of keyset cursors; starts over whenever the filters change
+    if st.session_state.get("ev_filters") != ev_filters:
+        st.session_state["ev_filters"] = ev_filters
+        st.session_state["ev_cursors"] = [None]
+    cursors = st.session_state["ev_cursors"]
+    c_prev, c_next = st.columns(2)
+    if c_prev.button("◀ Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+    rows, next_cursor = events.page(before=cursors[-1], **{k: v or None for k, v in ev_filters.items()})
+    if c_next.button("Older ▶", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        rows, next_cursor = events.page(before=cursors[-1], **{k: v or None for k, v in ev_filters.items()})
+    if rows:
+        st.dataframe([dict(zip(("id", "ts", "kind", "platform", "post_id", "latency_ms", "status", "message"), r),
+                           ts=datetime.fromtimestamp(r[1], timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+                      for r in rows])
+        st.caption(f"Page {len(cursors)}")
+    else:
+        st.caption("No events match.")
+
+with st.expander("⏱️ Startup & rerun timing"):
+    st.caption("Cold-start import cost per section and script run latency (previous runs).")
+    st.json(startup.report())
+
+startup.rendered(_script_started)
+
 # --------------------------------------------------
 # 6.  PACKAGE FOR OTHERS  (limited-scope keys)
 # --------------------------------------------------
@@ -0,0 +1,101 @@
+# batch_replies.py  – one LLM call drafts replies for several comments (JSON in, JSON out)
+import json, re
+from concurrent.futures import ThreadPoolExecutor
+from config import PRODUCT_URL, env_int
+from events import record
+from llm import BUSY_MESSAGE, PROVIDER_CONCURRENCY, smart_chat
+
+REPLY_BATCH_SIZE = env_int("REPLY_BATCH_SIZE", 8)
+# Batches drafted at once; provider semaphores in llm.py still cap real concurrency
+REPLY_WORKERS = env_int("REPLY_WORKERS", sum(PROVIDER_CONCURRENCY.values()))
+REPLY_TOKENS = 120            # per comment, same budget as a single reply
+REPLY_MAX_CHARS = 1000
+COMMENT_MAX_CHARS = 1500      # longer comments are trimmed in the prompt
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.I)
+
+
+def single_prompt(body):
+    return f"Reply politely to Reddit comment: {body}\nMention {PRODUCT_URL} in 1 sentence."
+
+
+def batch_prompt(comments):
+    payload = [{"id": c.id, "comment": c.body[:COMMENT_MAX_CHARS]} for c in comments]
+    return (
+        "You reply to Reddit comments on our posts. For EACH comment below write a short, polite reply "
+        f"that mentions {PRODUCT_URL} in 1 sentence.\n"
+        'Answer with JSON only, no prose: {"replies": [{"id": "<comment id>", "reply": "<text>"}]}\n'
+        "Comments:\n" + json.dumps(payload, ensure_ascii=False)
+    )
+
+
+def parse_replies(text, ids):
+    """{id: reply} for every well-formed entry whose id was asked for; bad entries are dropped"""
+    if not text or text == BUSY_MESSAGE:
+        return {}
+    text = _FENCE.sub("", text.strip())
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return {}
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text[start:])
+    except ValueError:
+        return {}
+    entries = data.get("replies", []) if isinstance(data, dict) else data
+    replies = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        id_, reply = str(entry.get("id", "")), entry.get("reply")
+        if id_ in ids and isinstance(reply, str) and reply.strip():
+            replies[id_] = reply.strip()[:REPLY_MAX_CHARS]
+    return replies
+
+
+def draft_one(comment):
+    reply = smart_chat(single_prompt(comment.body))
+    return None if not reply or reply == BUSY_MESSAGE else reply
+
+
+def draft_batch(comments):
+    """Replies for one batch: a JSON call first, then single calls for whatever it missed"""
+    if len(comments) == 1:
+        reply = draft_one(comments[0])
+        return {comments[0].id: reply} if reply else {}
+    ids = {c.id for c in comments}
+    replies = parse_replies(smart_chat(batch_prompt(comments), max_tokens=REPLY_TOKENS * len(comments) + 50), ids)
+    missing = [c for c in comments if c.id not in replies]
+    record("llm", f"batch of {len(comments)}: {len(replies)} parsed, {len(missing)} fallback",
+           platform="batch", status="ok" if not missing else "partial")
+    for comment in missing:
+        reply = draft_one(comment)
+        if reply:
+            replies[comment.id] = reply
+    return replies
+
+
+_pool = ThreadPoolExecutor(max_workers=max(1, REPLY_WORKERS), thread_name_prefix="reply-draft")
+
+
+def draft_stream(comments, batch_size=None):
+    """Yield (comment, reply or None) in input order while later batches are still drafting.
+
+    Every batch is queued on the drafting pool up front; the caller (the
+    single submitter) consumes results in order, so LLM latency overlaps the
+    spacing the platform's rate limit imposes between replies.
+    """
+    batch_size = batch_size or REPLY_BATCH_SIZE
+    batches = [comments[i:i + batch_size] for i in range(0, len(comments), batch_size)]
+    futures = [_pool.submit(draft_batch, batch) for batch in batches]
+    try:
+        for batch, future in zip(batches, futures):
+            try:
+                replies = future.result()
+            except Exception as e:
+                record("llm", f"reply batch failed: {e}", platform="batch", status="failed")
+                replies = {}
+            for comment in batch:
+                yield comment, replies.get(comment.id)
+    finally:
+        for future in futures:
+            future.cancel()  # consumer stopped early: don't draft what nobody will send
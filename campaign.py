@@ -0,0 +1,107 @@
+# campaign.py  – command line entry point:  python -m campaign worker | enqueue | status | train-filter | label...
+import argparse, json, os, signal, sys
+
+
+def _worker(args):
+    from worker import Worker
+    w = Worker(scheduler=not args.no_scheduler, drain=args.drain)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: w.stop())
+    w.run()
+
+
+def _enqueue(args):
+    from db import init_database
+    import commands
+    init_database()
+    extra = {"fresh": True} if args.fresh else {}
+    print(f"Queued {args.command} as command #{commands.enqueue(args.command, **extra)}")
+
+
+def _status(args):
+    from db import init_database
+    import commands
+    init_database()
+    for row in commands.recent(args.limit):
+        print(json.dumps(dict(zip(("id", "command", "status", "progress", "result", "worker", "created_at"), row))))
+
+
+def _train_filter(args):
+    from db import execute_db_query, init_database
+    from prefilter import MODEL_FILE, BagOfWords
+    init_database()
+    # Only labels the prefilter didn't produce: reception of our replies and
+    # hand labels. Its own accept/reject decisions would just teach it its rules.
+    rows = execute_db_query(
+        "SELECT body, label FROM seen_comments WHERE body IS NOT NULL AND label IS NOT NULL", fetch=True
+    ) or []
+    if len(rows) < args.min_samples:
+        print(f"Only {len(rows)} labelled comments; need {args.min_samples} "
+              "(run label-replies, or label comments by hand)")
+        return 1
+    output = args.output or MODEL_FILE
+    BagOfWords.train(rows).save(output)
+    print(f"Trained prefilter model on {len(rows)} comments -> {output}")
+    if os.path.abspath(output) == os.path.abspath(MODEL_FILE):
+        print("Running workers pick it up on their next replier run")
+    else:
+        print(f"Workers read {MODEL_FILE} (PREFILTER_MODEL); copy it there or point PREFILTER_MODEL at it")
+
+
+def _label_replies(args):
+    from db import init_database
+    from replier import label_replies
+    init_database()
+    labelled, checked = label_replies(args.limit)
+    print(f"Checked {checked} replies, {labelled} got a label")
+
+
+def _label(args):
+    from db import init_database
+    from seen import seen_index
+    init_database()
+    if not seen_index.label(args.comment_id, args.verdict == "yes"):
+        print(f"Unknown comment {args.comment_id}")
+        return 1
+    print(f"Labelled {args.comment_id}: {args.verdict}")
+
+
+def main(argv=None):
+    import commands
+    parser = argparse.ArgumentParser(prog="python -m campaign", description="Auto-campaign worker and queue tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("worker", help="run the scheduler and execute queued commands")
+    p.add_argument("--no-scheduler", action="store_true", help="only execute queued commands")
+    p.add_argument("--drain", action="store_true", help="publish due posts even while another worker leads")
+    p.set_defaults(func=_worker)
+
+    p = sub.add_parser("enqueue", help="queue a command for the worker")
+    p.add_argument("command", choices=commands.COMMANDS)
+    p.add_argument("--fresh", action="store_true", help="generate: skip the LLM cache")
+    p.set_defaults(func=_enqueue)
+
+    p = sub.add_parser("train-filter", help="train the comment prefilter model from reply history")
+    p.add_argument("--output", help="model file (default PREFILTER_MODEL or reply_model.json)")
+    p.add_argument("--min-samples", type=int, default=50)
+    p.set_defaults(func=_train_filter)
+
+    p = sub.add_parser("label-replies", help="label replied comments by how our reply was received")
+    p.add_argument("--limit", type=int, default=100)
+    p.set_defaults(func=_label_replies)
+
+    p = sub.add_parser("label", help="hand-label a seen comment for train-filter")
+    p.add_argument("comment_id")
+    p.add_argument("verdict", choices=("yes", "no"), help="was it worth replying to?")
+    p.set_defaults(func=_label)
+
+    p = sub.add_parser("status", help="show recent commands")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=_status)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
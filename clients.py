@@ -0,0 +1,161 @@
+# clients.py  – long-lived platform clients shared across ticks and threads
+import hashlib, sys, time, threading
+from config import (TW_API_KEY, TW_API_SECRET, TW_ACCESS, TW_ACCESS_SECRET,
+                    REDDIT_CLIENT, REDDIT_SECRET, REDDIT_USER, REDDIT_PW, REDDIT_UA, env_float)
+from http_client import http
+import metrics
+
+TOKEN_REFRESH_MARGIN_S = env_float("TOKEN_REFRESH_MARGIN_S", 300)  # refresh this long before expiry
+
+
+# --------------------------------------------------
+# 2.  PLATFORM CLIENTS
+# --------------------------------------------------
+def _build_twitter():
+    """Create Twitter client using API v1.1 (original working method)"""
+    import tweepy  # heavy SDK: imported on first use only
+    auth = tweepy.OAuth1UserHandler(TW_API_KEY, TW_API_SECRET, TW_ACCESS, TW_ACCESS_SECRET)
+    api = tweepy.API(auth)
+    api.session = http.session("https://api.twitter.com")  # shared keep-alive pool
+    return api
+
+
+def _build_reddit():
+    import praw  # heavy SDK: imported on first use only
+    reddit = praw.Reddit(
+        client_id=REDDIT_CLIENT,
+        client_secret=REDDIT_SECRET,
+        username=REDDIT_USER,
+        password=REDDIT_PW,
+        user_agent=REDDIT_UA,
+        requestor_kwargs={"session": http.session("https://oauth.reddit.com")}
+    )
+    # Fetch the OAuth token now rather than on the first submit/reply
+    _refresh_reddit_token(reddit, force=True)
+    return reddit
+
+
+def _reddit_authorizer(reddit):
+    return getattr(getattr(reddit, "_core", None), "_authorizer", None)
+
+
+def _token_seconds_left(authorizer):
+    """Seconds until the cached OAuth token expires, or None if unknown"""
+    if authorizer is None or not getattr(authorizer, "access_token", None):
+        return None
+    expires_ns = getattr(authorizer, "_expiration_timestamp_ns", None)  # prawcore >= 2.4 (monotonic)
+    if expires_ns is not None:
+        return (expires_ns - time.monotonic_ns()) / 1e9
+    expires = getattr(authorizer, "_expiration_timestamp", None)        # older prawcore (wall clock)
+    return None if expires is None else expires - time.time()
+
+
+def _refresh_reddit_token(reddit, force=False):
+    authorizer = _reddit_authorizer(reddit)
+    if authorizer is None or not hasattr(authorizer, "refresh"):
+        return False
+    left = _token_seconds_left(authorizer)
+    if force or left is None or left < TOKEN_REFRESH_MARGIN_S:
+        authorizer.refresh()
+        return True
+    return False
+
+
+BUILDERS = {
+    # platform -> (builder, credentials that identify the account, proactive refresh)
+    "x": (_build_twitter, lambda: (TW_API_KEY, TW_ACCESS), None),
+    "reddit": (_build_reddit, lambda: (REDDIT_CLIENT, REDDIT_USER), _refresh_reddit_token),
+}
+
+
+def is_auth_error(exc):
+    """True for 401-style failures that a fresh client/token can fix"""
+    tweepy = sys.modules.get("tweepy")  # never imported just to check
+    if tweepy is not None and isinstance(exc, tweepy.Unauthorized):
+        return True
+    name = type(exc).__name__
+    if name in ("OAuthException", "InvalidToken"):
+        return True
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) == 401
+
+
+class ClientRegistry:
+    """One client per (platform, credential set), built on first use.
+
+    Clients are shared across scheduler ticks and threads. Reddit tokens are
+    refreshed shortly before they expire; a client is only rebuilt after an
+    auth error (see ``call``). PRAW isn't thread-safe, so calls on the same
+    client are serialized through its lock.
+    """
+
+    def __init__(self, builders=BUILDERS):
+        self.builders = builders
+        self._clients = {}  # key -> {"client", "lock", "built_at"}
+        self._lock = threading.Lock()
+        self.stats = {"builds": 0, "reuses": 0, "refreshes": 0, "auth_rebuilds": 0}
+
+    def _key(self, platform):
+        creds = "\x1f".join(str(c) for c in self.builders[platform][1]())
+        return platform, hashlib.sha256(creds.encode("utf-8")).hexdigest()[:16]
+
+    def _entry(self, platform):
+        key = self._key(platform)
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = self._clients[key] = {"client": None, "lock": threading.RLock(), "built_at": None}
+        return entry
+
+    def get(self, platform):
+        """The shared client for ``platform``, building or refreshing it if needed"""
+        builder, _, refresh = self.builders[platform]
+        entry = self._entry(platform)
+        with entry["lock"]:
+            if entry["client"] is None:
+                entry["client"] = builder()
+                entry["built_at"] = time.time()
+                self.stats["builds"] += 1
+            else:
+                self.stats["reuses"] += 1
+                if refresh:
+                    try:
+                        if refresh(entry["client"]):
+                            self.stats["refreshes"] += 1
+                    except Exception as e:
+                        if not is_auth_error(e):
+                            raise
+                        self._rebuild(entry, builder)
+            return entry["client"]
+
+    def _rebuild(self, entry, builder):
+        entry["client"] = builder()
+        entry["built_at"] = time.time()
+        self.stats["auth_rebuilds"] += 1
+
+    def lock(self, platform):
+        """Re-entrant lock serializing use of ``platform``'s client"""
+        return self._entry(platform)["lock"]
+
+    def invalidate(self, platform):
+        entry = self._entry(platform)
+        with entry["lock"]:
+            entry["client"] = None
+
+    def call(self, platform, fn):
+        """Run ``fn(client)`` under the client's lock; on an auth error rebuild once and retry"""
+        with self.lock(platform):
+            try:
+                return fn(self.get(platform))
+            except Exception as e:
+                if not is_auth_error(e):
+                    raise
+                self.invalidate(platform)
+                self.stats["auth_rebuilds"] += 1
+                return fn(self.get(platform))
+
+
+client_registry = ClientRegistry()
+
+metrics.collect("campaign_client_registry_total", "Platform client builds, reuses, token refreshes and auth rebuilds",
+                lambda: client_registry.stats, label="stat")
@@ -0,0 +1,66 @@
+# commands.py  – command queue: the UI enqueues, the worker claims and runs
+import json, time
+from db import execute_db_query
+
+COMMANDS = ("generate", "post_now", "reply_now")
+
+
+def enqueue(command, **args):
+    """Queue a command for the worker; returns its id"""
+    if command not in COMMANDS:
+        raise ValueError(f"Unknown command: {command}")
+    rows = execute_db_query(
+        "INSERT INTO commands(command, args, created_at) VALUES(?,?,?) RETURNING id",
+        (command, json.dumps(args), int(time.time())), fetch=True
+    )
+    return rows[0][0]
+
+
+def claim_next(worker):
+    """Atomically mark the oldest pending command as running; (id, command, args) or None.
+
+    A read-only probe of the partial pending index comes first, so an idle
+    poll costs a WAL read instead of a write transaction.
+    """
+    if not execute_db_query("SELECT 1 FROM commands WHERE status='pending' LIMIT 1", fetch=True):
+        return None
+    rows = execute_db_query(
+        "UPDATE commands SET status='running', worker=?, started_at=? "
+        "WHERE id = (SELECT id FROM commands WHERE status='pending' ORDER BY id LIMIT 1) "
+        "RETURNING id, command, args",
+        (worker, int(time.time())), fetch=True
+    )
+    if not rows:
+        return None
+    id_, command, args = rows[0]
+    return id_, command, json.loads(args or "{}")
+
+
+def set_progress(id_, text):
+    execute_db_query("UPDATE commands SET progress=? WHERE id=?", (text, id_))
+
+
+def finish(id_, result, ok=True):
+    execute_db_query(
+        "UPDATE commands SET status=?, result=?, finished_at=? WHERE id=?",
+        ("done" if ok else "failed", result, int(time.time()), id_)
+    )
+
+
+def fail_interrupted():
+    """Mark commands left 'running' by a dead worker as failed (they are not retried blindly).
+    A worker holding any live lease (its presence lease, see worker.py) is
+    still running its command, even if it lost the scheduler lease."""
+    now = int(time.time())
+    execute_db_query(
+        "UPDATE commands SET status='failed', result='interrupted', finished_at=? WHERE status='running' "
+        "AND worker NOT IN (SELECT holder FROM leases WHERE expires_at >= ?)", (now, now)
+    )
+
+
+def recent(limit=20):
+    """Latest commands for the UI, newest first"""
+    return execute_db_query(
+        "SELECT id, command, status, progress, result, worker, created_at FROM commands "
+        "ORDER BY id DESC LIMIT ?", (limit,), fetch=True
+    ) or []
@@ -0,0 +1,61 @@
+# config.py  – environment / secrets shared by the app, worker and helpers
+import os
+import pathlib
+from dotenv import load_dotenv
+
+# --------------------------------------------------
+# 0.  ENV / SECRETS  (never commit to git)
+# --------------------------------------------------
+# Load .env from .streamlit if present
+dotenv_path = pathlib.Path(__file__).parent / ".." / ".streamlit" / ".env"
+if dotenv_path.exists():
+    load_dotenv(dotenv_path)
+else:
+    load_dotenv()
+
+# Only use os.getenv for all posting keys
+GROQ_KEY        = os.getenv("GROQ_KEY") or os.getenv("GROQAPI_KEY")
+OPENROUTER_KEY  = os.getenv("OPENROUTER_KEY")
+GEMINI_API_KEY  = os.getenv("GEMINI_API_KEY")
+TW_API_KEY      = os.getenv("TW_API_KEY")
+TW_API_SECRET   = os.getenv("TW_API_SECRET")
+TW_ACCESS       = os.getenv("TW_ACCESS")
+TW_ACCESS_SECRET= os.getenv("TW_ACCESS_SECRET")
+TW_BEARER       = os.getenv("TW_BEARER")
+CLIENT_ID       = os.getenv("CLIENT_ID")
+CLIENT_SECRET   = os.getenv("CLIENT_SECRET")
+REDDIT_CLIENT   = os.getenv("REDDIT_CLIENT")
+REDDIT_SECRET   = os.getenv("REDDIT_SECRET")
+REDDIT_USER     = os.getenv("REDDIT_USER")
+REDDIT_PW       = os.getenv("REDDIT_PW")
+REDDIT_UA       = os.getenv("REDDIT_UA")
+LINKEDIN_CLIENT = os.getenv("LINKEDIN_CLIENT")
+LINKEDIN_SECRET = os.getenv("LINKEDIN_SECRET")
+LINKEDIN_TOKEN  = os.getenv("LINKEDIN_TOKEN")
+WHATSAPP_TOKEN  = os.getenv("WHATSAPP_TOKEN")
+PRODUCT_URL     = os.getenv("PRODUCT_URL", "https://bit.ly/qorganizer")
+
+DB_FILE         = os.getenv("CAMPAIGN_DB", "campaign.db")
+
+
+def env_int(name, default):
+    """Integer setting from the environment, falling back on missing/bad values"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name, default):
+    """Float counterpart of env_int"""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Post claims (posting.py); the scheduler filters its due list the same way.
+# Claims let several worker processes drain the queue without double posts.
+POST_LEASE_S = env_int("POST_LEASE_S", 300)          # claim lifetime, renewed while a tick runs
+POST_CLAIM_BATCH = env_int("POST_CLAIM_BATCH", 50)   # rows claimed per tick
+POST_MAX_ATTEMPTS = env_int("POST_MAX_ATTEMPTS", 5)  # failed publishes before a row is left alone
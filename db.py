@@ -0,0 +1,580 @@
+# db.py  – pooled SQLite access for campaign.db
+import atexit, time, sqlite3, threading
+from datetime import timezone
+from config import DB_FILE
+import metrics
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=memory",
+    "PRAGMA mmap_size=268435456",  # 256MB
+)
+
+
+_query_seconds = metrics.histogram("campaign_db_query_seconds", "SQLite statement time (excluding lock wait)",
+                                   ("kind",), metrics.DB_BUCKETS)
+_lock_wait_seconds = metrics.histogram("campaign_db_lock_wait_seconds", "Time spent waiting for the write lock",
+                                       buckets=metrics.DB_BUCKETS)
+
+
+class ConnectionPool:
+    """Long-lived per-thread SQLite connections.
+
+    Each thread gets its own connection the first time it touches the
+    database; PRAGMAs are applied once at that point. Writes are serialized
+    through ``write_lock``; under WAL, reads go straight to the thread's
+    connection without waiting on writers.
+    """
+
+    def __init__(self, path, timeout=30.0, max_retries=3):
+        self.path = path
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.write_lock = threading.Lock()
+        self.wal = False
+        self._local = threading.local()
+        self._registry = {}  # thread -> connection, so dead threads can be reaped
+        self._registry_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "reads": 0,
+            "writes": 0,
+            "lock_waits": 0,
+            "lock_wait_total_s": 0.0,
+            "lock_wait_max_s": 0.0,
+            "busy_retries": 0,
+            "batched_rows": 0,
+        }
+
+    # ---------- connections ----------
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.timeout)
+        for pragma in PRAGMAS:
+            row = conn.execute(pragma).fetchone()
+            if pragma.startswith("PRAGMA journal_mode"):
+                self.wal = bool(row) and str(row[0]).lower() == "wal"
+        return conn
+
+    def _reap(self):
+        """Close connections owned by threads that have exited (Streamlit reruns, finished jobs)"""
+        dead = [t for t in self._registry if not t.is_alive()]
+        for t in dead:
+            try:
+                self._registry.pop(t).close()
+            except Exception:
+                pass
+            self._bump("connections_closed")
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._registry_lock:
+                self._reap()
+                self._registry[threading.current_thread()] = conn
+            self._bump("connections_opened")
+        self._bump("checkouts")
+        return conn
+
+    # ---------- stats ----------
+    def _bump(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _record_wait(self, waited):
+        with self._stats_lock:
+            self._stats["lock_waits"] += 1
+            self._stats["lock_wait_total_s"] += waited
+            self._stats["lock_wait_max_s"] = max(self._stats["lock_wait_max_s"], waited)
+
+    def stats(self):
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        with self._registry_lock:
+            snapshot["connections_open"] = len(self._registry)
+        snapshot["wal"] = self.wal
+        waits = snapshot["lock_waits"]
+        snapshot["lock_wait_avg_s"] = snapshot["lock_wait_total_s"] / waits if waits else 0.0
+        return snapshot
+
+    # ---------- queries ----------
+    def _acquire_writer(self):
+        start = time.perf_counter()
+        self.write_lock.acquire()
+        waited = time.perf_counter() - start
+        self._record_wait(waited)
+        _lock_wait_seconds.observe(waited)
+
+    def execute(self, query, params=None, fetch=False):
+        read_only = fetch and _is_read(query)
+        for attempt in range(self.max_retries):
+            conn = self.connection()
+            locked = not (read_only and self.wal)
+            if locked:
+                self._acquire_writer()
+            start = time.perf_counter()
+            try:
+                cursor = conn.execute(query, params or ())
+                result = cursor.fetchall() if fetch else None
+                if read_only:
+                    self._bump("reads")
+                else:
+                    conn.commit()
+                    self._bump("writes")
+                _query_seconds.observe(time.perf_counter() - start, kind="read" if read_only else "write")
+                return result
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if "database is locked" in str(e) and attempt < self.max_retries - 1:
+                    self._bump("busy_retries")
+                    time.sleep(0.1 * (attempt + 1))  # Progressive backoff
+                    continue
+                raise
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            finally:
+                if locked:
+                    self.write_lock.release()
+        return None
+
+    def execute_many(self, query, seq_of_params):
+        """Run one statement for every parameter tuple inside a single transaction"""
+        rows = list(seq_of_params)
+        if not rows:
+            return 0
+        for attempt in range(self.max_retries):
+            conn = self.connection()
+            self._acquire_writer()
+            start = time.perf_counter()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.executemany(query, rows)
+                conn.commit()
+                _query_seconds.observe(time.perf_counter() - start, kind="batch")
+                self._bump("writes")
+                self._bump("batched_rows", len(rows))
+                return cursor.rowcount
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if "database is locked" in str(e) and attempt < self.max_retries - 1:
+                    self._bump("busy_retries")
+                    time.sleep(0.1 * (attempt + 1))  # Progressive backoff
+                    continue
+                raise
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            finally:
+                self.write_lock.release()
+        return 0
+
+
+class WriteBehindBuffer:
+    """Collect parameter tuples for one statement and write them in batches.
+
+    A batch is flushed when it reaches ``max_items`` or when the oldest
+    pending row is ``max_age`` seconds old (checked by a daemon timer), so a
+    burst of status updates costs one commit instead of one per row.
+    """
+
+    def __init__(self, query, max_items=100, max_age=2.0, pool=None):
+        self.query = query
+        self.max_items = max_items
+        self.max_age = max_age
+        self.pool = pool
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, params):
+        with self._lock:
+            self._pending.append(params)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._pending) >= self.max_items
+            self._ensure_timer()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything pending now; returns the number of rows written.
+
+        If the write fails the rows go back to the front of the buffer (the
+        timer keeps retrying them) and the error is re-raised.
+        """
+        with self._lock:
+            rows, oldest = self._pending, self._oldest
+            self._pending, self._oldest = [], None
+        if not rows:
+            return 0
+        try:
+            (self.pool or db_pool).execute_many(self.query, rows)
+        except Exception:
+            with self._lock:
+                self._pending = rows + self._pending
+                self._oldest = oldest if self._oldest is None else min(oldest, self._oldest)
+                self._ensure_timer()
+            raise
+        return len(rows)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _ensure_timer(self):
+        if self._timer is None:
+            self._timer = threading.Thread(target=self._run_timer, daemon=True)
+            self._timer.start()
+
+    def _run_timer(self):
+        while True:
+            time.sleep(self.max_age / 2)
+            with self._lock:
+                oldest = self._oldest
+                if oldest is None:
+                    self._timer = None
+                    return
+            if time.monotonic() - oldest >= self.max_age:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Write-behind flush error: {e}")
+
+
+def _is_read(query):
+    return query.lstrip().split(None, 1)[0].upper() == "SELECT"
+
+
+db_pool = ConnectionPool(DB_FILE)
+metrics.collect("campaign_db_pool", "SQLite pool connections, checkouts, writer-lock waits and busy retries",
+                db_pool.stats, label="stat", kind="untyped")
+
+
+INSERT_POST_SQL = (
+    "INSERT OR IGNORE INTO posts(id, platform, text, scheduled, posted, permalink, due_at) "
+    "VALUES(?,?,?,?,0,'',?)"
+)
+
+# poster() marks rows as sent through this buffer and flushes it at the end of
+# each tick (while the rows are still claimed); permalink is optional
+# (LinkedIn doesn't return one). claimed_by is kept as "posted by".
+post_status_writer = WriteBehindBuffer(
+    "UPDATE posts SET posted=1, permalink=COALESCE(?, permalink), lease_until=0 WHERE id=?"
+)
+atexit.register(post_status_writer.flush)
+
+
+def get_db_connection():
+    """Get this thread's pooled connection (WAL mode, PRAGMAs already applied)"""
+    return db_pool.connection()
+
+
+def execute_db_query(query, params=None, fetch=False):
+    """Execute database query through the pool with locking and busy retries"""
+    return db_pool.execute(query, params, fetch)
+
+
+def execute_many(query, seq_of_params):
+    """Bulk insert/update in one transaction (one commit for the whole batch)"""
+    return db_pool.execute_many(query, seq_of_params)
+
+
+def pool_stats():
+    """Checkout, lock-wait and busy-retry counters for the shared pool"""
+    return db_pool.stats()
+
+
+# --------------------------------------------------
+# SCHEMA MIGRATIONS  (tracked in PRAGMA user_version)
+# --------------------------------------------------
+def _add_column(conn, table, column, decl):
+    """ALTER TABLE ... ADD COLUMN, tolerating databases that already have it"""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _m001_posts(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS posts(
+        id TEXT PRIMARY KEY,
+        platform TEXT,
+        text TEXT,
+        scheduled TEXT,
+        posted INTEGER DEFAULT 0,
+        permalink TEXT
+    )""")
+
+
+# strftime('%s') honours "+HH:MM"/"Z" suffixes and treats naive strings as UTC
+EPOCH_SQL = "CAST(strftime('%s', {col}) AS INTEGER)"
+
+
+def _m002_posts_due_at(conn):
+    # Integer UTC epoch next to the display string; ISO strings with mixed
+    # offsets don't compare correctly, and an index on them can't help.
+    _add_column(conn, "posts", "due_at", "INTEGER")
+    conn.execute(f"UPDATE posts SET due_at = {EPOCH_SQL.format(col='scheduled')} WHERE due_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_due ON posts(due_at, id) WHERE posted=0")
+    # Writers that only know about `scheduled` (helper scripts, older tools)
+    # still get a due_at filled in.
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS posts_due_at_insert AFTER INSERT ON posts
+    WHEN NEW.due_at IS NULL BEGIN
+        UPDATE posts SET due_at = {EPOCH_SQL.format(col='NEW.scheduled')} WHERE id = NEW.id;
+    END""")
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS posts_due_at_update AFTER UPDATE OF scheduled ON posts
+    WHEN NEW.due_at IS OLD.due_at BEGIN
+        UPDATE posts SET due_at = {EPOCH_SQL.format(col='NEW.scheduled')} WHERE id = NEW.id;
+    END""")
+
+
+def _m003_model_health(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS model_health(
+        model TEXT PRIMARY KEY,            -- "provider:model"
+        successes INTEGER DEFAULT 0,
+        failures INTEGER DEFAULT 0,
+        consecutive_failures INTEGER DEFAULT 0,
+        rate_limited INTEGER DEFAULT 0,
+        server_errors INTEGER DEFAULT 0,
+        latency_ewma REAL,
+        trips INTEGER DEFAULT 0,
+        open_until INTEGER DEFAULT 0,
+        updated_at INTEGER
+    )""")
+
+
+def _m004_llm_cache(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS llm_cache(
+        key TEXT PRIMARY KEY,              -- sha256 of normalized prompt + params
+        response TEXT NOT NULL,
+        created_at INTEGER NOT NULL,
+        last_used INTEGER NOT NULL,
+        hits INTEGER DEFAULT 0
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache(last_used)")
+
+
+def _m005_commands(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS commands(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        command TEXT NOT NULL,             -- "generate", "post_now", "reply_now"
+        args TEXT NOT NULL DEFAULT '{}',   -- JSON keyword arguments
+        status TEXT NOT NULL DEFAULT 'pending',  -- pending/running/done/failed
+        worker TEXT,
+        progress TEXT,
+        result TEXT,
+        created_at INTEGER NOT NULL,
+        started_at INTEGER,
+        finished_at INTEGER
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_commands_pending ON commands(id) WHERE status='pending'")
+
+
+def _m006_leases(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS leases(
+        name TEXT PRIMARY KEY,             -- e.g. "scheduler"
+        holder TEXT NOT NULL,              -- host:pid of the worker
+        acquired_at INTEGER NOT NULL,
+        heartbeat_at INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL
+    )""")
+
+
+def _m007_posts_claims(conn):
+    # Workers claim due rows before publishing; an expired lease_until makes
+    # the row claimable again (crashed worker), attempts caps retries.
+    _add_column(conn, "posts", "claimed_by", "TEXT")
+    _add_column(conn, "posts", "lease_until", "INTEGER DEFAULT 0")
+    _add_column(conn, "posts", "attempts", "INTEGER DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_claimed ON posts(claimed_by) WHERE posted=0")
+
+
+def _m008_events(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS events(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,  -- keyset cursor (monotonic with ts)
+        ts INTEGER NOT NULL,
+        kind TEXT NOT NULL,                    -- post/reply/llm/command/error
+        platform TEXT,                         -- x/reddit/linkedin, or provider for llm
+        post_id TEXT,                          -- posts.id, comment id, or model
+        latency_ms REAL,
+        status TEXT,                           -- ok/failed/deferred/HTTP status
+        message TEXT
+    )""")
+    # Filtered pages walk one of these backwards from the cursor
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_kind ON events(kind, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_platform ON events(platform, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts)")
+
+
+def _m009_posts_browse(conn):
+    # Keyset pages over every post (the due index only covers unsent rows)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_due_all ON posts(due_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_platform_due ON posts(platform, due_at, id)")
+    # Bumped by triggers on every write to posts, so cached pages know when they are stale
+    conn.execute("CREATE TABLE IF NOT EXISTS table_versions(name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO table_versions(name, version) VALUES('posts', 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_version_{event.lower()} AFTER {event} ON posts
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = 'posts';
+        END""")
+
+
+def _m010_seen_comments(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS seen_comments(
+        comment_id TEXT PRIMARY KEY,
+        submission_id TEXT,
+        created_utc REAL,
+        action TEXT,                       -- replied/skipped/filtered/failed
+        seen_at INTEGER NOT NULL
+    ) WITHOUT ROWID""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS submission_marks(
+        submission_id TEXT PRIMARY KEY,
+        last_created_utc REAL NOT NULL,    -- every comment at or before this is handled
+        updated_at INTEGER NOT NULL
+    ) WITHOUT ROWID""")
+
+
+def _m011_cursors(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS cursors(
+        name TEXT PRIMARY KEY,             -- e.g. "reddit:submission_replies"
+        value REAL NOT NULL,               -- created_utc of the newest fully handled item
+        updated_at INTEGER NOT NULL
+    ) WITHOUT ROWID""")
+
+
+def _m012_seen_comment_body(conn):
+    # Text of replied/filtered comments: training data for the prefilter model
+    _add_column(conn, "seen_comments", "body", "TEXT")
+
+
+def _m013_reply_attempts(conn):
+    # Failed reply attempts per comment; after REPLY_MAX_ATTEMPTS it is marked 'failed'
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS reply_attempts(
+        comment_id TEXT PRIMARY KEY,
+        attempts INTEGER NOT NULL,
+        last_error TEXT,
+        updated_at INTEGER NOT NULL
+    ) WITHOUT ROWID""")
+
+
+def _m014_rate_buckets(conn):
+    # Token buckets shared by every worker posting for the same account (ratelimit.py)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rate_buckets(
+        platform TEXT NOT NULL,
+        account TEXT NOT NULL,
+        action TEXT NOT NULL,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL,          -- epoch seconds of the last refill
+        blocked_until REAL NOT NULL DEFAULT 0,  -- epoch; Retry-After / RATELIMIT / remaining=0
+        granted INTEGER NOT NULL DEFAULT 0,     -- did the last take succeed (see _TAKE_SQL)
+        PRIMARY KEY(platform, account, action)
+    ) WITHOUT ROWID""")
+
+
+def _m015_seen_comment_labels(conn):
+    # Training labels the prefilter doesn't produce itself: how our reply was
+    # received, or a hand label (python -m campaign label ...)
+    _add_column(conn, "seen_comments", "reply_id", "TEXT")
+    _add_column(conn, "seen_comments", "label", "INTEGER")     # 1 worth replying, 0 not, NULL unknown
+    _add_column(conn, "seen_comments", "label_source", "TEXT")  # "reception" / "hand"
+
+
+def _m016_llm_event_status(conn):
+    # llm.call_model used to store failures with the HTTP code ("429") or
+    # "error" as status, which the event filter can't select; it now writes
+    # "failed" with the code in the message. Only those two legacy forms are
+    # rewritten: batch drafts (batch_replies.py) keep their "partial" rows.
+    conn.execute("""
+    UPDATE events SET message = CASE WHEN status = 'error' THEN 'request error' ELSE 'HTTP ' || status END,
+                      status = 'failed'
+    WHERE kind = 'llm' AND (status GLOB '[0-9]*' OR status = 'error')""")
+
+
+MIGRATIONS = [
+    (1, "create posts table", _m001_posts),
+    (2, "posts.due_at epoch column + partial due index", _m002_posts_due_at),
+    (3, "model_health table for the LLM router", _m003_model_health),
+    (4, "llm_cache table with LRU index", _m004_llm_cache),
+    (5, "commands queue between UI and worker", _m005_commands),
+    (6, "leases table for the single scheduler leader", _m006_leases),
+    (7, "posts claim columns for leased posting workers", _m007_posts_claims),
+    (8, "structured events table", _m008_events),
+    (9, "posts browse indexes + table_versions", _m009_posts_browse),
+    (10, "seen_comments index + per-submission high-water marks", _m010_seen_comments),
+    (11, "cursors table for incremental harvesting", _m011_cursors),
+    (12, "seen_comments.body for prefilter training", _m012_seen_comment_body),
+    (13, "reply_attempts for comments whose reply keeps failing", _m013_reply_attempts),
+    (14, "rate_buckets shared by all workers", _m014_rate_buckets),
+    (15, "seen_comments reply_id + training labels", _m015_seen_comment_labels),
+    (16, "llm events: failures as status 'failed'", _m016_llm_event_status),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(pool=None):
+    """Apply pending migrations in order, one transaction each. Returns the new version."""
+    pool = pool or db_pool
+    conn = pool.connection()
+    with pool.write_lock:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, description, step in MIGRATIONS:
+            if target <= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {int(target)}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"Database migrated to v{target}: {description}")
+            version = target
+    return version
+
+
+def to_epoch(dt):
+    """UTC epoch seconds for an aware datetime (naive values are taken as UTC)"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def init_database():
+    """Initialize database with proper error handling"""
+    try:
+        version = migrate()
+        if version > SCHEMA_VERSION:
+            print(f"Database is at schema v{version}, newer than this code (v{SCHEMA_VERSION}); "
+                  "upgrade this worker/app")
+        return True
+    except Exception as e:
+        print(f"Database initialization error: {e}")
+        return False
@@ -0,0 +1,65 @@
+# events.py  – structured event log (posts, replies, LLM calls, commands, errors)
+import atexit, time
+from config import env_float, env_int
+from db import WriteBehindBuffer, execute_db_query
+
+KINDS = ("post", "reply", "llm", "command", "error")
+STATUSES = ("ok", "failed", "deferred", "filtered", "partial", "gap")
+EVENTS_PAGE_SIZE = 50
+EVENTS_RETENTION_S = env_float("EVENTS_RETENTION_S", 30 * 24 * 3600)
+EVENTS_PRUNE_BATCH = env_int("EVENTS_PRUNE_BATCH", 5000)  # rows per DELETE, so writers aren't held up
+
+# Callers never wait on SQLite: rows are batched and committed together by
+# the write-behind timer (or when 200 are pending).
+event_writer = WriteBehindBuffer(
+    "INSERT INTO events(ts, kind, platform, post_id, latency_ms, status, message) VALUES(?,?,?,?,?,?,?)",
+    max_items=200, max_age=1.0
+)
+atexit.register(event_writer.flush)
+
+
+def record(kind, message=None, platform=None, post_id=None, latency_s=None, status=None):
+    """Queue one event row (cheap, safe from any thread)"""
+    latency_ms = None if latency_s is None else round(latency_s * 1000, 1)
+    event_writer.add((int(time.time()), kind, platform, post_id, latency_ms, status, message))
+
+
+def page(before=None, limit=EVENTS_PAGE_SIZE, kind=None, platform=None, status=None, since=None):
+    """One page of events, newest first, strictly older than cursor ``before``.
+
+    Keyset pagination: cost depends on the page size, not on how deep into
+    the history the page is. Returns (rows, next_cursor); next_cursor is None
+    on the last page.
+    """
+    where, params = [], []
+    for column, value in (("kind", kind), ("platform", platform), ("status", status)):
+        if value:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if since:
+        where.append("ts >= ?")
+        params.append(int(since))
+    if before:
+        where.append("id < ?")
+        params.append(int(before))
+    query = "SELECT id, ts, kind, platform, post_id, latency_ms, status, message FROM events"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    rows = execute_db_query(query + " ORDER BY id DESC LIMIT ?", (*params, limit + 1), fetch=True) or []
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (rows[-1][0] if more else None)
+
+
+def prune(older_than_s=EVENTS_RETENTION_S, batch=EVENTS_PRUNE_BATCH):
+    """Delete events older than ``older_than_s`` (walks idx_events_ts); returns the count"""
+    cutoff = int(time.time() - older_than_s)
+    deleted = 0
+    while True:
+        rows = execute_db_query(
+            "DELETE FROM events WHERE id IN (SELECT id FROM events WHERE ts < ? ORDER BY ts LIMIT ?) RETURNING id",
+            (cutoff, batch), fetch=True
+        ) or []
+        deleted += len(rows)
+        if len(rows) < batch:
+            return deleted
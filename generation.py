@@ -0,0 +1,90 @@
+# generation.py  – content calendar + concurrent post generation
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from config import PRODUCT_URL, env_int
+from db import INSERT_POST_SQL, execute_many, to_epoch
+from llm import BUSY_MESSAGE, PROVIDER_CONCURRENCY, smart_chat
+from scheduler import wake
+
+# Enough workers to keep every provider's slots busy; smart_chat's provider
+# semaphores do the actual per-provider limiting.
+GENERATION_WORKERS = env_int("GENERATION_WORKERS", sum(PROVIDER_CONCURRENCY.values()))
+GENERATION_BATCH = env_int("GENERATION_BATCH", 10)  # rows per INSERT transaction
+
+
+# --------------------------------------------------
+# 3.  2-WEEK CALENDAR (EXTENSIBLE)
+# --------------------------------------------------
+def get_plan():
+    # This could be loaded from a config/db in the future
+    platforms = [
+        {"platform": "x", "prompt": "Write a catchy 1-sentence tweet about messy downloads"},
+        {"platform": "reddit", "prompt": "150-word intro post for r/productivity", "sub": "productivity"},
+        {"platform": "linkedin", "prompt": "100-word LinkedIn post for freelancers"}
+    ]
+    plan = []
+    for day in range(14):
+        for i, p in enumerate(platforms):
+            entry = dict(p)
+            entry["day"] = day
+            # Spread posts throughout the day (every 8 hours)
+            entry["hour_offset"] = i * 8
+            plan.append(entry)
+    return plan
+
+
+def generate_entry(p, base, fresh=False):
+    """Generate the text for one plan entry; returns a posts row or None"""
+    hour_offset = p.get("hour_offset", 0)
+    post_id = f"{p['platform']}_{p['day']}_{hour_offset}"
+    # The calendar slot is part of the cache key: every day shares a prompt
+    # but should get its own text, while regenerating a slot reuses it.
+    text = smart_chat(p["prompt"] + f"\nEnd with link: {PRODUCT_URL}", max_tokens=120,
+                      fresh=fresh, variant=post_id)
+    if not text or text == BUSY_MESSAGE:
+        return None
+    # Calculate schedule time with hour offset for better distribution
+    due = base + timedelta(days=p["day"], hours=hour_offset)
+    return (post_id, p["platform"], text, due.isoformat(timespec="minutes"), to_epoch(due))
+
+
+def generate_posts(plan=None, workers=None, on_progress=None, batch_size=None, fresh=False):
+    """Fan plan entries out over a worker pool and stream finished posts into the DB.
+
+    Rows are inserted in batches as they complete, so a crash or a slow tail
+    doesn't lose the posts already generated. ``on_progress(done, total,
+    queued)`` runs in the calling thread (safe for Streamlit widgets).
+    ``fresh`` bypasses the LLM cache for brand-new variations.
+    Returns ``(queued, failed)``.
+    """
+    plan = get_plan() if plan is None else plan
+    workers = workers or GENERATION_WORKERS
+    batch_size = batch_size or GENERATION_BATCH
+    base = datetime.now(timezone.utc)
+    pending, queued, failed, done = [], 0, 0, 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="generate") as pool:
+        futures = [pool.submit(generate_entry, p, base, fresh) for p in plan]
+        for future in as_completed(futures):
+            done += 1
+            try:
+                row = future.result()
+            except Exception:
+                row = None
+            if row:
+                pending.append(row)
+            else:
+                failed += 1
+            if len(pending) >= batch_size:
+                execute_many(INSERT_POST_SQL, pending)
+                wake()  # day-0 posts may be due right away
+                queued += len(pending)
+                pending = []
+            if on_progress:
+                on_progress(done, len(plan), queued)
+
+    if pending:
+        execute_many(INSERT_POST_SQL, pending)
+        wake()
+        queued += len(pending)
+    return queued, failed
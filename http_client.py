@@ -0,0 +1,117 @@
+# http_client.py  – shared keep-alive HTTP sessions for every outbound API
+import time, threading, requests
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from config import env_float, env_int
+import metrics
+
+HTTP_POOL_SIZE = env_int("HTTP_POOL_SIZE", 10)                # keep-alive sockets per host
+HTTP_CONNECT_TIMEOUT = env_float("HTTP_CONNECT_TIMEOUT", 3.05)
+HTTP_READ_TIMEOUT = env_float("HTTP_READ_TIMEOUT", 15)
+HTTP_RETRIES = env_int("HTTP_RETRIES", 2)
+HTTP_MAX_RETRY_AFTER = env_float("HTTP_MAX_RETRY_AFTER", 30)  # longer waits are returned to the caller
+HTTP_BACKOFF = env_float("HTTP_BACKOFF", 0.5)
+
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+def retry_after_seconds(response, default=None):
+    """Parse Retry-After (seconds or HTTP date); ``default`` if missing/unparseable"""
+    return parse_retry_after(response.headers.get("Retry-After"), default)
+
+
+def parse_retry_after(value, default=None):
+    """Seconds from a Retry-After header value (delta-seconds or HTTP date)"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class HTTPClient:
+    """One pooled ``requests.Session`` per host, shared by all threads.
+
+    Timeouts are split into connect/read. Responses with a retryable status
+    are retried after their Retry-After delay (or exponential backoff) as
+    long as that delay is under ``max_retry_after``; otherwise the response
+    is handed back so the caller can fall back or reschedule. Non-idempotent
+    requests are only retried when the server refused them (429/503) or the
+    connection never opened, so a POST is never published twice.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                 retries=HTTP_RETRIES, max_retry_after=HTTP_MAX_RETRY_AFTER):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.max_retry_after = max_retry_after
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "errors": 0, "sessions": 0}
+
+    def _bump(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def session(self, url):
+        """The shared session for ``url``'s scheme+host, created on first use"""
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            s = self._sessions.get(origin)
+            if s is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                self._sessions[origin] = s
+                self.stats["sessions"] += 1
+            return s
+
+    def request(self, method, url, timeout=None, retries=None, max_retry_after=None, **kwargs):
+        method = method.upper()
+        retries = self.retries if retries is None else retries
+        max_retry_after = self.max_retry_after if max_retry_after is None else max_retry_after
+        session = self.session(url)
+        for attempt in range(retries + 1):
+            backoff = HTTP_BACKOFF * (2 ** attempt)
+            self._bump("requests")
+            try:
+                r = session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except requests.ConnectionError as e:  # includes ConnectTimeout
+                self._bump("errors")
+                safe = method in IDEMPOTENT or isinstance(e, requests.ConnectTimeout)
+                if safe and attempt < retries:
+                    self._bump("retries")
+                    time.sleep(backoff)
+                    continue
+                raise
+            refused = method in IDEMPOTENT or r.status_code in (429, 503)
+            if r.status_code in RETRY_STATUSES and refused and attempt < retries:
+                wait = retry_after_seconds(r, backoff)
+                if wait <= max_retry_after:
+                    self._bump("retries")
+                    r.close()
+                    time.sleep(wait)
+                    continue
+            return r
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+http = HTTPClient()
+metrics.collect("campaign_http_total", "Outgoing HTTP requests, retries, errors and sessions opened",
+                lambda: http.stats, label="stat")
@@ -0,0 +1,125 @@
+# lease.py  – DB-backed leader lease with heartbeat, so only one scheduler runs
+import os, socket, threading, time
+from config import DB_FILE, env_float
+from db import ConnectionPool, execute_db_query
+
+LEASE_TTL_S = env_float("LEASE_TTL_S", 10)              # a silent leader is replaced after this
+LEASE_HEARTBEAT_S = env_float("LEASE_HEARTBEAT_S", 3)   # renew / retry interval
+
+# Renewals use their own connections with a busy timeout of one heartbeat, so
+# a busy database can't hold a renewal past the TTL (the shared pool waits
+# 30s per attempt, three times).
+_lease_pool = ConnectionPool(DB_FILE, timeout=LEASE_HEARTBEAT_S, max_retries=1)
+
+# Take the row if it is ours or expired; the WHERE makes the upsert a no-op
+# (and RETURNING empty) while another holder's lease is still live.
+_ACQUIRE_SQL = """
+INSERT INTO leases(name, holder, acquired_at, heartbeat_at, expires_at) VALUES(?,?,?,?,?)
+ON CONFLICT(name) DO UPDATE SET
+    acquired_at = CASE WHEN leases.holder = excluded.holder THEN leases.acquired_at ELSE excluded.acquired_at END,
+    holder = excluded.holder,
+    heartbeat_at = excluded.heartbeat_at,
+    expires_at = excluded.expires_at
+WHERE leases.holder = excluded.holder OR leases.expires_at < excluded.heartbeat_at
+RETURNING holder
+"""
+
+
+def worker_id():
+    """Identity used for lease holders and post claims"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def current(name):
+    """{"holder", "acquired_at", "heartbeat_at", "expires_at", "alive"} or None"""
+    rows = execute_db_query(
+        "SELECT holder, acquired_at, heartbeat_at, expires_at FROM leases WHERE name=?", (name,), fetch=True
+    )
+    if not rows:
+        return None
+    holder, acquired_at, heartbeat_at, expires_at = rows[0]
+    return {"holder": holder, "acquired_at": acquired_at, "heartbeat_at": heartbeat_at,
+            "expires_at": expires_at, "alive": expires_at >= time.time()}
+
+
+class Lease:
+    """Named lease held by at most one process at a time.
+
+    ``keep_alive`` renews it every ``heartbeat`` seconds while held and
+    otherwise retries acquisition, so a crashed leader is replaced within
+    ``ttl + heartbeat`` seconds. ``held`` runs out on this process's own
+    clock ``ttl`` seconds after the last successful renewal, when another
+    worker may take over, even if no renewal has answered since;
+    ``on_lost`` is then called from a lease thread.
+    """
+
+    def __init__(self, name, holder, ttl=LEASE_TTL_S, heartbeat=LEASE_HEARTBEAT_S, on_lost=None):
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.on_lost = on_lost
+        self._valid_until = 0.0  # monotonic
+        self._was_held = False
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "renewals": 0, "lost": 0}
+
+    @property
+    def held(self):
+        return time.monotonic() < self._valid_until
+
+    def try_acquire(self):
+        """Acquire or renew; returns whether we hold the lease now"""
+        started, now = time.monotonic(), time.time()
+        try:
+            rows = _lease_pool.execute(
+                _ACQUIRE_SQL, (self.name, self.holder, int(now), int(now), int(now + self.ttl)), fetch=True
+            )
+        except Exception as e:
+            print(f"Lease {self.name} error: {e}")  # a held lease stays ours until it runs out
+        else:
+            # Counted from before the query: the row says expires_at = now + ttl
+            self._valid_until = started + self.ttl if rows else 0.0
+            if rows:
+                self.stats["renewals" if self._was_held else "acquired"] += 1
+        self._check()
+        return self.held
+
+    def _check(self):
+        """Notice (once) that the lease was taken or ran out"""
+        with self._lock:
+            held = self.held
+            was_held, self._was_held = self._was_held, held
+            if not (was_held and not held):
+                return
+            self.stats["lost"] += 1
+        if self.on_lost:
+            try:
+                self.on_lost()
+            except Exception as e:
+                print(f"Lease {self.name} on_lost error: {e}")
+
+    def release(self):
+        if self._was_held:
+            _lease_pool.execute("DELETE FROM leases WHERE name=? AND holder=?", (self.name, self.holder))
+        with self._lock:
+            self._valid_until, self._was_held = 0.0, False
+
+    def keep_alive(self, stop):
+        """Renew or retry every heartbeat until ``stop`` (a threading.Event) is set"""
+        while not stop.is_set():
+            self.try_acquire()
+            stop.wait(self.heartbeat)
+
+    def _watch(self, stop):
+        """Notice the expiry on time even while a renewal is stuck in the database"""
+        while not stop.is_set():
+            remaining = self._valid_until - time.monotonic()
+            stop.wait(max(0.05, min(self.heartbeat, remaining)) if remaining > 0 else self.heartbeat)
+            self._check()
+
+    def start(self, stop):
+        threading.Thread(target=self._watch, args=(stop,), name=f"lease-watch-{self.name}", daemon=True).start()
+        thread = threading.Thread(target=self.keep_alive, args=(stop,), name=f"lease-{self.name}", daemon=True)
+        thread.start()
+        return thread
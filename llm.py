@@ -0,0 +1,272 @@
+# llm.py  – Groq / OpenRouter / Gemini chat with fallback
+import os, time, threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import GROQ_KEY, OPENROUTER_KEY, GEMINI_API_KEY, env_float, env_int
+from events import record
+from http_client import http
+from llm_cache import cache_key, llm_cache
+import metrics
+from router import router
+
+# -------------------- LLM Fallback Logic --------------------
+FALLBACK_MODELS = [
+    # Compound models (Groq, rate-limited, not paywalled)
+    "compound-beta-kimi",
+    "compound-beta-mini",
+    "compound-beta",
+    # Fastest, direct Groq API models
+    "gemma-7b-it",
+    "llama3-8b-8192",
+    "mixtral-8x7b-32768",
+    "mistral-7b-instruct",
+    "llama-3.1-8b-instant"
+]
+
+OPENROUTER_MODELS = [
+    "google/gemma-2-9b-it:free",
+    "google/gemini-1.5-flash-latest:free",
+    "moonshotai/kimi-k2:free",
+    "mistralai/mistral-7b-instruct:free"
+]
+
+BUSY_MESSAGE = "⚠️ All free models busy, please retry."
+
+# Max in-flight requests per provider, shared by every thread in the process
+# (generation pipeline workers, replier, UI). Free tiers throttle hard.
+PROVIDER_CONCURRENCY = {
+    "groq": env_int("GROQ_CONCURRENCY", 4),
+    "openrouter": env_int("OPENROUTER_CONCURRENCY", 2),
+    "gemini": env_int("GEMINI_CONCURRENCY", 2),
+}
+# A 429 asking us to wait longer than this goes back to the router, which
+# falls through to the next model instead of sleeping.
+LLM_MAX_RETRY_AFTER = env_float("LLM_MAX_RETRY_AFTER", 2)
+
+_llm_requests = metrics.counter("campaign_llm_requests_total", "Model requests by provider, model and status",
+                               ("provider", "model", "status"))
+_llm_seconds = metrics.histogram("campaign_llm_request_seconds", "Latency of one model request",
+                                 ("provider", "model"))
+_chat_total = metrics.counter("campaign_llm_chat_total", "smart_chat calls by result (ok, busy, cached)", ("result",))
+_fallback_depth = metrics.histogram("campaign_llm_fallback_depth",
+                                    "Position in the fallback order of the model that answered",
+                                    buckets=(0, 1, 2, 3, 5, 8, 13))
+metrics.collect("campaign_llm_cache_lookups_total", "LLM cache lookups by result", lambda: llm_cache.stats)
+
+_provider_slots = {name: threading.BoundedSemaphore(max(1, n)) for name, n in PROVIDER_CONCURRENCY.items()}
+
+
+def provider_slot(provider):
+    """Context manager holding one of the provider's concurrency slots"""
+    return _provider_slots[provider]
+
+
+def _candidates():
+    """(provider, model) pairs in static fallback order, limited to providers with a key.
+    smart_chat re-sorts them by health (see router.py)."""
+    candidates = []
+    if GROQ_KEY:
+        candidates += [("groq", m) for m in FALLBACK_MODELS]
+    if OPENROUTER_KEY:
+        candidates += [("openrouter", m) for m in OPENROUTER_MODELS]
+    if GEMINI_API_KEY:
+        candidates.append(("gemini", "gemini-pro"))
+    return candidates
+
+
+def _request(provider, model, prompt, max_tokens):
+    if provider == "groq":
+        return http.post(
+            "https://api.groq.com/openai/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {GROQ_KEY}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens
+            },
+            max_retry_after=LLM_MAX_RETRY_AFTER
+        )
+    if provider == "openrouter":
+        return http.post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_KEY}",
+                "HTTP-Referer": "https://kamandalabs.me"
+            },
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens
+            },
+            max_retry_after=LLM_MAX_RETRY_AFTER
+        )
+    gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+    return http.post(
+        gemini_url + f"?key={GEMINI_API_KEY}",
+        json={
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"maxOutputTokens": max_tokens}
+        },
+        max_retry_after=LLM_MAX_RETRY_AFTER
+    )
+
+
+def _parse(provider, r):
+    if provider == "gemini":
+        return r.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
+    return r.json()["choices"][0]["message"]["content"].strip()
+
+
+def call_model(provider, model, prompt, max_tokens, cancelled=None):
+    """One request to one model. Returns the completion text, or None on any failure."""
+    status, start = None, None
+    try:
+        with provider_slot(provider):
+            if cancelled is not None and cancelled.is_set():
+                return None
+            start = time.monotonic()
+            r = _request(provider, model, prompt, max_tokens)
+        status = r.status_code
+        if r.status_code == 200:
+            text = _parse(provider, r)
+            elapsed = time.monotonic() - start
+            latency.record(elapsed)
+            _llm_seconds.observe(elapsed, provider=provider, model=model)
+            _llm_requests.inc(provider=provider, model=model, status="ok")
+            router.record(provider, model, True, elapsed)
+            record("llm", platform=provider, post_id=model, latency_s=elapsed, status="ok")
+            return text
+    except Exception:
+        pass
+    router.record(provider, model, False, status=status)
+    if start is not None:  # not for calls cancelled before they started
+        _llm_requests.inc(provider=provider, model=model, status=str(status or "error"))
+        # Always "failed" so the event filter finds it; the code goes in the message
+        record("llm", f"HTTP {status}" if status else "request error", platform=provider, post_id=model,
+               latency_s=time.monotonic() - start, status="failed")
+    return None
+
+
+# --------------------------------------------------
+# HEDGED REQUESTS  (opt-in, LLM_HEDGE=1 or smart_chat(..., hedge=True))
+# --------------------------------------------------
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = env_float("LLM_HEDGE_PERCENTILE", 0.9)
+HEDGE_DEFAULT_S = env_float("LLM_HEDGE_DEFAULT_S", 4.0)  # until enough samples exist
+HEDGE_MIN_S = env_float("LLM_HEDGE_MIN_S", 0.5)
+HEDGE_MAX_INFLIGHT = env_int("LLM_HEDGE_MAX_INFLIGHT", 3)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, size=200, min_samples=10):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_after(self):
+        """Seconds to wait on an attempt before racing the next candidate"""
+        p = self.percentile(HEDGE_PERCENTILE)
+        return max(HEDGE_MIN_S, p if p is not None else HEDGE_DEFAULT_S)
+
+
+latency = LatencyTracker()
+hedge_stats = {"calls": 0, "hedges": 0, "hedge_wins": 0}
+metrics.collect("campaign_llm_hedge_total", "Hedged smart_chat calls, extra attempts launched, and wins by a later candidate",
+                lambda: hedge_stats, label="event")
+_stats_lock = threading.Lock()
+_hedge_pool = ThreadPoolExecutor(max_workers=env_int("LLM_HEDGE_POOL", 16), thread_name_prefix="llm-hedge")
+
+
+def _bump(key):
+    with _stats_lock:
+        hedge_stats[key] += 1
+
+
+def _hedged_chat(candidates, prompt, max_tokens):
+    """Race candidates: start the next one whenever the leader is slower than
+    the latency threshold (or fails). Returns (first completion, its position in
+    ``candidates``), or (None, None); the other attempts are cancelled."""
+    _bump("calls")
+    cancelled = threading.Event()
+    remaining = enumerate(candidates)
+    inflight = {}  # future -> position in the fallback order
+
+    def launch():
+        order, nxt = next(remaining, (None, None))
+        if nxt is None:
+            return False
+        inflight[_hedge_pool.submit(call_model, *nxt, prompt, max_tokens, cancelled)] = order
+        return True
+
+    launch()
+    try:
+        while inflight:
+            can_hedge = len(inflight) < HEDGE_MAX_INFLIGHT
+            done, _ = wait(list(inflight), timeout=latency.hedge_after() if can_hedge else None,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                if launch():
+                    _bump("hedges")
+                continue
+            for future in done:
+                order = inflight.pop(future)
+                text = future.result()
+                if text:
+                    if order > 0:
+                        _bump("hedge_wins")
+                    return text, order
+                # A failed attempt is replaced straight away, like the sequential walk
+                launch()
+        return None, None
+    finally:
+        cancelled.set()
+        for future in inflight:
+            future.cancel()
+
+
+def smart_chat(prompt, max_tokens=120, hedge=None, fresh=False, model_class="chat", variant=None):
+    """Ask the fallback chain for a completion.
+
+    Answers are cached by (normalized prompt, max_tokens, model_class,
+    variant); pass ``fresh=True`` to skip the cache when a new variation is
+    wanted. ``hedge`` (default: LLM_HEDGE) races the next candidate whenever
+    the current one runs past the recent p90 latency instead of waiting for
+    its read timeout.
+    """
+    key = cache_key(prompt, max_tokens, model_class, variant)
+    if fresh:
+        llm_cache.note_bypass()
+    else:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            _chat_total.inc(result="cached")
+            return cached
+    candidates = router.order(_candidates())
+    if LLM_HEDGE if hedge is None else hedge:
+        text, depth = _hedged_chat(candidates, prompt, max_tokens)
+    else:
+        text, depth = next(((t, i) for i, t in enumerate(call_model(p, m, prompt, max_tokens)
+                                                         for p, m in candidates) if t), (None, None))
+    if not text:
+        _chat_total.inc(result="busy")
+        return BUSY_MESSAGE
+    _chat_total.inc(result="ok")
+    _fallback_depth.observe(depth)
+    llm_cache.put(key, text)
+    return text
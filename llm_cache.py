@@ -0,0 +1,125 @@
+# llm_cache.py  – two-tier (memory + SQLite) cache for smart_chat responses
+import hashlib, re, time, threading
+from collections import OrderedDict
+from config import env_int
+from db import WriteBehindBuffer, execute_db_query
+
+CACHE_TTL_S = env_int("LLM_CACHE_TTL_S", 7 * 24 * 3600)
+CACHE_MAX_ROWS = env_int("LLM_CACHE_MAX_ROWS", 5000)      # SQLite tier, LRU-evicted
+CACHE_HOT_SIZE = env_int("LLM_CACHE_HOT_SIZE", 256)       # in-process tier
+EVICT_EVERY = 50                                          # stores between eviction sweeps
+
+_WS = re.compile(r"\s+")
+
+
+def cache_key(prompt, max_tokens, model_class="chat", variant=None):
+    """Stable key over the normalized prompt and the parameters that shape the answer"""
+    normalized = _WS.sub(" ", prompt).strip()
+    raw = "\x1f".join((model_class, str(max_tokens), str(variant or ""), normalized))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """TTL cache with an LRU hot tier in memory and a size-bounded SQLite tier"""
+
+    def __init__(self, ttl=CACHE_TTL_S, max_rows=CACHE_MAX_ROWS, hot_size=CACHE_HOT_SIZE):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.hot_size = hot_size
+        self._hot = OrderedDict()  # key -> (response, created_at)
+        self._lock = threading.Lock()
+        self._stores_since_evict = 0
+        self._touch = WriteBehindBuffer(
+            "UPDATE llm_cache SET last_used=?, hits=hits+1 WHERE key=?", max_items=100, max_age=5.0
+        )
+        self.stats = {"hot_hits": 0, "db_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+
+    def _bump(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _remember(self, key, response, created_at):
+        with self._lock:
+            self._hot[key] = (response, created_at)
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.hot_size:
+                self._hot.popitem(last=False)
+
+    def get(self, key):
+        now = int(time.time())
+        with self._lock:
+            hit = self._hot.get(key)
+            if hit and now - hit[1] < self.ttl:
+                self._hot.move_to_end(key)
+                self.stats["hot_hits"] += 1
+            else:
+                hit = None
+                self._hot.pop(key, None)
+        if hit:
+            self._touch.add((now, key))
+            return hit[0]
+        try:
+            rows = execute_db_query(
+                "SELECT response, created_at FROM llm_cache WHERE key=? AND created_at > ?",
+                (key, now - self.ttl), fetch=True
+            )
+        except Exception:
+            rows = None
+        if not rows:
+            self._bump("misses")
+            return None
+        response, created_at = rows[0]
+        self._remember(key, response, created_at)
+        self._bump("db_hits")
+        self._touch.add((now, key))
+        return response
+
+    def note_bypass(self):
+        """Count a lookup skipped on purpose (smart_chat(..., fresh=True))"""
+        self._bump("bypassed")
+
+    def put(self, key, response):
+        now = int(time.time())
+        self._remember(key, response, now)
+        try:
+            execute_db_query(
+                "INSERT INTO llm_cache(key, response, created_at, last_used) VALUES(?,?,?,?) "
+                "ON CONFLICT(key) DO UPDATE SET response=excluded.response, "
+                "created_at=excluded.created_at, last_used=excluded.last_used",
+                (key, response, now, now)
+            )
+        except Exception as e:
+            print(f"LLM cache store error: {e}")
+            return
+        self._bump("stores")
+        with self._lock:
+            self._stores_since_evict += 1
+            due = self._stores_since_evict >= EVICT_EVERY
+            if due:
+                self._stores_since_evict = 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop expired rows, then least-recently-used rows beyond max_rows"""
+        self._touch.flush()
+        now = int(time.time())
+        execute_db_query("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,))
+        count = execute_db_query("SELECT COUNT(*) FROM llm_cache", fetch=True)[0][0]
+        if count > self.max_rows:
+            execute_db_query(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                (count - self.max_rows,)
+            )
+            self._bump("evictions", count - self.max_rows)
+
+    def snapshot(self):
+        with self._lock:
+            snap = dict(self.stats, hot_entries=len(self._hot))
+        lookups = snap["hot_hits"] + snap["db_hits"] + snap["misses"]
+        snap["hit_rate"] = round((snap["hot_hits"] + snap["db_hits"]) / lookups, 3) if lookups else 0.0
+        return snap
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,178 @@
+# logs.py  – activity log shared by the UI and background jobs
+#
+# Every process appends to LOG_FILE (rotated by size and age). Readers keep a
+# LogTail that remembers its byte offset, so a refresh only reads what was
+# appended since, into an in-memory ring shared by all threads and sessions.
+import os, threading, time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from config import env_int
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is only serialized within one process
+    fcntl = None
+
+LOG_FILE = os.getenv("CAMPAIGN_LOG_FILE", "campaign_logs.txt")
+LOG_MAX_BYTES = env_int("LOG_MAX_BYTES", 1024 * 1024)   # rotate past this size...
+LOG_MAX_AGE_S = env_int("LOG_MAX_AGE_S", 24 * 3600)     # ...or once the first line is this old
+LOG_BACKUPS = env_int("LOG_BACKUPS", 3)                 # campaign_logs.txt.1 .. .N
+LOG_RING_SIZE = env_int("LOG_RING_SIZE", 500)           # lines kept in memory
+LOG_BOOTSTRAP_BYTES = 64 * 1024                         # history read by a fresh tail
+
+log_lock = threading.Lock()
+
+
+# --------------------------------------------------
+# WRITING + ROTATION
+# --------------------------------------------------
+def _first_line_time(path):
+    """Timestamp of the file's first entry (cheap: reads one short line)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            head = f.readline(64)
+        return datetime.fromisoformat(head[1:head.index("]")]).timestamp()
+    except (OSError, ValueError):
+        return None
+
+
+_first_line_cache = (None, None)  # (inode, first entry time) of the current file
+
+
+def _should_rotate(path, now):
+    global _first_line_cache
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if st.st_size >= LOG_MAX_BYTES:
+        return True
+    inode, started = _first_line_cache
+    if inode != st.st_ino or started is None:
+        started = _first_line_time(path)
+        _first_line_cache = (st.st_ino, started)
+    return started is not None and now - started >= LOG_MAX_AGE_S
+
+
+@contextmanager
+def _rotation_lock(path):
+    """Exclusive across processes (the worker and the UI append to the same file)"""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def rotate(path=LOG_FILE):
+    """campaign_logs.txt -> .1 -> .2 ... (oldest dropped); tails notice the new file"""
+    for i in range(LOG_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    if LOG_BACKUPS > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+def add_log(message):
+    """Append a timestamped line to the shared log file (safe from any thread)"""
+    now = time.time()
+    timestamp = datetime.fromtimestamp(now, timezone.utc).isoformat(timespec='seconds')
+    log_entry = f"[{timestamp}] {message}"
+    with log_lock:
+        try:
+            if _should_rotate(LOG_FILE, now):
+                with _rotation_lock(LOG_FILE):
+                    # Another process may have rotated while we waited for the
+                    # lock; decide again on the file that is there now
+                    if _should_rotate(LOG_FILE, now):
+                        rotate(LOG_FILE)
+            with open(LOG_FILE, "a", encoding="utf-8") as f:
+                f.write(log_entry + "\n")
+        except OSError:
+            pass  # Ignore file write errors
+    return log_entry
+
+
+# --------------------------------------------------
+# READING  (ring buffer fed by an incremental tail)
+# --------------------------------------------------
+class LogTail:
+    """Follow a log file by byte offset, restarting when it is rotated or truncated.
+
+    ``refresh()`` costs O(bytes appended since the last call). Complete
+    lines go into a bounded ring of (seq, line) so callers can ask for the
+    latest N or everything after a sequence number.
+    """
+
+    def __init__(self, path=LOG_FILE, ring_size=LOG_RING_SIZE):
+        self.path = path
+        self.ring = deque(maxlen=ring_size)
+        self.seq = 0
+        self._inode = None
+        self._offset = 0
+        self._partial = ""
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Read newly appended lines; returns how many were added"""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return 0
+            bootstrap = False
+            if st.st_ino != self._inode and self._inode is not None:
+                self._drain_rotated()
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # New (rotated) or truncated file: start over; on the very first
+                # read only take the tail end of the history.
+                bootstrap = self._inode is None and st.st_size > LOG_BOOTSTRAP_BYTES
+                self._offset = st.st_size - LOG_BOOTSTRAP_BYTES if bootstrap else 0
+                self._inode, self._partial = st.st_ino, ""
+            if st.st_size == self._offset:
+                return 0
+            return self._read(self.path, skip_first=bootstrap)
+
+    def _read(self, path, skip_first=False):
+        with open(path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        self._offset += len(chunk)
+        lines = (self._partial + chunk.decode("utf-8", errors="replace")).split("\n")
+        self._partial = lines.pop()
+        if skip_first and lines:
+            lines = lines[1:]  # first line is cut in the middle
+        for line in lines:
+            if line:
+                self.seq += 1
+                self.ring.append((self.seq, line))
+        return len(lines)
+
+    def _drain_rotated(self):
+        """Pick up lines written to the old file between our last read and its rotation"""
+        try:
+            if os.stat(f"{self.path}.1").st_ino == self._inode:
+                self._read(f"{self.path}.1")
+        except OSError:
+            pass
+
+    def recent(self, limit=50, after=0):
+        """Up to ``limit`` newest lines with sequence number > ``after``, oldest first"""
+        with self._lock:
+            lines = [line for seq, line in self.ring if seq > after]
+        return lines[-limit:] if limit > 0 else []
+
+
+tail = LogTail()
+
+
+def recent_logs(limit=50, after=0):
+    """Refresh the shared tail and return the latest lines"""
+    tail.refresh()
+    return tail.recent(limit, after)
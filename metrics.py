@@ -0,0 +1,264 @@
+# metrics.py  – in-process counters/histograms, exported in the Prometheus text format
+import bisect, glob, math, os, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import env_float, env_int
+
+METRICS_FILE = os.getenv("CAMPAIGN_METRICS_FILE", "campaign_metrics.prom")
+METRICS_PORT = env_int("METRICS_PORT", 0)              # 0: no HTTP endpoint, textfile only
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+METRICS_INTERVAL_S = env_float("METRICS_INTERVAL_S", 15)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _fmt(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_, labels=()):
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in series]
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label set (cumulative buckets, sum, count)"""
+    kind = "histogram"
+
+    def __init__(self, name, help_, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self, labels)
+
+    def lines(self):
+        with self._lock:
+            series = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._series.items())
+        out = []
+        for key, (counts, total, count) in series:
+            running = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                running += n
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _fmt(bound))])} {running}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Collected(_Metric):
+    """Values read from an existing stats dict at export time (cache hit counters etc.)"""
+
+    def __init__(self, name, help_, fn, label, kind="counter"):
+        super().__init__(name, help_, (label,))
+        self.fn = fn
+        self.kind = kind
+
+    def lines(self):
+        try:
+            values = self.fn() or {}
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.labelnames, (k,))} {_fmt(v)}" for k, v in sorted(values.items())
+                if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_, labels=()):
+        return self._get(Counter, name, help_, labels)
+
+    def histogram(self, name, help_, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_, labels, buckets)
+
+    def collect(self, name, help_, fn, label="result", kind="counter"):
+        return self._get(Collected, name, help_, fn, label, kind)
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        out = []
+        for metric in metrics:
+            lines = metric.lines()
+            if lines:
+                out += metric.header() + lines
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+counter, histogram, collect = registry.counter, registry.histogram, registry.collect
+
+
+# --------------------------------------------------
+# EXPORT  (textfile for node_exporter / the UI, optional /metrics endpoint)
+# --------------------------------------------------
+def textfile_for(worker):
+    """Per-worker textfile next to METRICS_FILE (campaign_metrics.<host_pid>.prom),
+    so workers never overwrite each other's export"""
+    root, ext = os.path.splitext(METRICS_FILE)
+    name = re.sub(r"[^\w.-]", "_", worker)
+    return f"{root}.{name}{ext or '.prom'}"
+
+
+def worker_textfiles():
+    """Existing per-worker textfiles, most recently written first"""
+    root, ext = os.path.splitext(METRICS_FILE)
+    mtimes = []
+    for path in glob.glob(f"{glob.escape(root)}.*{ext or '.prom'}"):
+        try:
+            mtimes.append((os.path.getmtime(path), path))
+        except OSError:
+            pass  # removed by a worker that just stopped
+    return [path for _, path in sorted(mtimes, reverse=True)]
+
+
+def write_textfile(path=METRICS_FILE):
+    """Atomically replace ``path`` with the current metrics"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # scrapes would otherwise flood stderr
+
+
+def serve(port=METRICS_PORT, addr=METRICS_ADDR):
+    """Serve /metrics on a daemon thread; returns the server (call .shutdown() to stop)"""
+    server = ThreadingHTTPServer((addr, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_exporter(stop, path=METRICS_FILE, interval=METRICS_INTERVAL_S, port=METRICS_PORT):
+    """Rewrite the textfile every ``interval`` seconds until ``stop`` is set (plus once
+    at the end); also serve /metrics when ``port`` is set. Returns the thread."""
+    server = serve(port) if port else None
+
+    def run():
+        try:
+            while not stop.wait(interval):
+                try:
+                    write_textfile(path)
+                except OSError:
+                    pass
+        finally:
+            try:
+                write_textfile(path)
+            except OSError:
+                pass
+            if server:
+                server.shutdown()
+
+    thread = threading.Thread(target=run, name="metrics-export", daemon=True)
+    thread.start()
+    return thread
+
+
+def parse(text):
+    """[(name, {labels}, value)] from exposition text, for display; bucket lines are dropped"""
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        head, _, value = line.rpartition(" ")
+        name, _, rest = head.partition("{")
+        if name.endswith("_bucket"):
+            continue
+        labels = {}
+        for pair in rest.rstrip("}").split('",') if rest else []:
+            k, _, v = pair.partition("=")
+            labels[k] = v.strip('"')
+        try:
+            samples.append((name, labels, float(value)))
+        except ValueError:
+            continue
+    return samples
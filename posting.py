@@ -0,0 +1,302 @@
+# posting.py  – due-post dispatch to per-platform worker queues
+import math, time, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from clients import client_registry
+from config import LINKEDIN_TOKEN, POST_CLAIM_BATCH, POST_LEASE_S, POST_MAX_ATTEMPTS, env_int
+from db import execute_db_query, post_status_writer
+from events import record
+from generation import get_plan
+from http_client import http
+from lease import worker_id
+from logs import add_log
+import metrics
+from ratelimit import INLINE_WAIT_S, limiter
+from scheduler import note_backlog
+
+# Posts in flight per platform. 1 keeps each account strictly sequential
+# (PRAW isn't thread-safe, and bursts look spammy), while platforms still
+# run side by side.
+POST_CONCURRENCY = {
+    "x": env_int("POST_CONCURRENCY_X", 1),
+    "reddit": env_int("POST_CONCURRENCY_REDDIT", 1),
+    "linkedin": env_int("POST_CONCURRENCY_LINKEDIN", 1),
+}
+
+
+# --------------------------------------------------
+# PLATFORM PUBLISHERS  (return (permalink, summary label) or None)
+# --------------------------------------------------
+def _publish_x(id_, txt):
+    # Use Twitter API v1.1 method (original working method)
+    tweet = client_registry.call("x", lambda api: api.update_status(txt))
+    add_log(f"Posted to X: {tweet.id}")
+    return f"https://twitter.com/i/web/status/{tweet.id}", "X (Twitter)"
+
+
+def _reddit_sub(id_):
+    return next((p.get("sub") for p in get_plan()
+                 if f"{p['platform']}_{p['day']}_{p['hour_offset']}" == id_), None)
+
+
+def _publish_reddit(id_, txt):
+    sub = _reddit_sub(id_)
+    if not sub:
+        return None
+    def submit(reddit):
+        post = reddit.subreddit(sub).submit(title=txt[:100], selftext=txt)
+        limiter.observe_sent(limiter.observe_reddit, reddit)
+        return post
+    post = client_registry.call("reddit", submit)
+    add_log(f"Posted to Reddit r/{sub}: {post.url}")
+    return post.url, f"Reddit (r/{sub})"
+
+
+def _publish_linkedin(id_, txt):
+    headers = {"Authorization": f"Bearer {LINKEDIN_TOKEN}", "Content-Type": "application/json"}
+    payload = {"author": "urn:li:person:me", "lifecycleState": "PUBLISHED",
+               "specificContent": {"com.linkedin.ugc.ShareContent": {
+                   "shareCommentary": {"text": txt}, "shareMediaCategory": "NONE"}},
+               "visibility": {"com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"}}
+    r = http.post("https://api.linkedin.com/v2/ugcPosts", headers=headers, json=payload)
+    limiter.observe_sent(limiter.observe_headers, "linkedin", "post", r.headers)
+    if r.status_code == 429:
+        raise RateLimited(r)
+    if r.status_code != 201:
+        add_log(f"LinkedIn rejected {id_}: HTTP {r.status_code}")
+        return None
+    add_log(f"Posted to LinkedIn: {id_}")
+    return None, "LinkedIn"
+
+
+class RateLimited(Exception):
+    """A platform answered 429; carries the response for Retry-After"""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+PUBLISHERS = {"x": _publish_x, "reddit": _publish_reddit, "linkedin": _publish_linkedin}
+
+
+def _unpublishable(id_, plat):
+    """Why a row can't be published at all (checked before it takes a rate-limit token), or None"""
+    if plat == "reddit" and not _reddit_sub(id_):
+        return "no subreddit in the plan"
+    if plat == "linkedin" and not LINKEDIN_TOKEN:
+        return "LINKEDIN_TOKEN not set"
+    return None
+
+
+# --------------------------------------------------
+# PER-PLATFORM WORKERS
+# --------------------------------------------------
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def platform_worker(platform):
+    """The long-lived executor (queue + threads) that serializes one platform"""
+    with _workers_lock:
+        worker = _workers.get(platform)
+        if worker is None:
+            worker = _workers[platform] = ThreadPoolExecutor(
+                max_workers=max(1, POST_CONCURRENCY.get(platform, 1)),
+                thread_name_prefix=f"post-{platform}"
+            )
+        return worker
+
+
+_next_slot = {}  # platform -> epoch of the latest deferral handed out
+_slot_lock = threading.Lock()
+
+
+def _spread(plat, wait):
+    """Deferral for one more row waiting on ``plat``: at least ``wait``, and one
+    token interval after the previous deferral, so rows don't all come due
+    together and bounce off the limiter again"""
+    rate = limiter.bucket(plat, "post").rate
+    now = time.time()
+    with _slot_lock:
+        at = max(now + wait, _next_slot.get(plat, 0.0) + (1 / rate if rate > 0 else 0.0))
+        _next_slot[plat] = at
+    return at - now
+
+
+def defer(id_, seconds):
+    """Push an unsent post's due time (and the shown schedule) to when its
+    platform has capacity again. Releases the claim; a rate-limit deferral
+    doesn't count as an attempt."""
+    limiter.note_deferred()
+    execute_db_query(
+        "UPDATE posts SET due_at=?1, scheduled=strftime('%Y-%m-%dT%H:%M', ?1, 'unixepoch'), "
+        "claimed_by=NULL, lease_until=0, attempts=MAX(attempts-1, 0) WHERE id=?2 AND posted=0",
+        (math.ceil(time.time() + seconds), id_)
+    )
+
+
+def release(id_):
+    """Give a claimed row back after a failed publish so a later tick retries it"""
+    rows = execute_db_query(
+        "UPDATE posts SET claimed_by=NULL, lease_until=0 WHERE id=? AND posted=0 RETURNING attempts",
+        (id_,), fetch=True
+    )
+    if rows and rows[0][0] >= POST_MAX_ATTEMPTS:
+        add_log(f"Giving up on {id_} after {rows[0][0]} attempts")
+
+
+_posts_total = metrics.counter("campaign_posts_total", "Publish attempts by platform and outcome",
+                               ("platform", "status"))
+_post_seconds = metrics.histogram("campaign_post_seconds", "Time spent in a platform publish call",
+                                  ("platform", "status"))
+
+
+def _observe(plat, status, elapsed):
+    _posts_total.inc(platform=plat, status=status)
+    _post_seconds.observe(elapsed, platform=plat, status=status)
+
+
+def _take_capacity(id_, plat):
+    """Token for one post: short waits are slept exactly, long ones defer the row"""
+    wait = limiter.try_acquire(plat, "post")
+    if wait <= 0:
+        return True
+    if wait <= INLINE_WAIT_S and limiter.acquire(plat, "post", max_wait=INLINE_WAIT_S):
+        return True
+    wait = _spread(plat, wait)
+    defer(id_, wait)
+    add_log(f"{plat} at its rate limit; {id_} deferred {wait:.0f}s")
+    record("post", f"rate limit, deferred {wait:.0f}s", platform=plat, post_id=id_, status="deferred")
+    _posts_total.inc(platform=plat, status="deferred")
+    return False
+
+
+def publish(id_, plat, txt):
+    """Publish one row and queue its status update; returns the summary label or None"""
+    reason = _unpublishable(id_, plat)
+    if reason:
+        add_log(f"Not posting {id_} to {plat}: {reason}")
+        record("post", f"not published: {reason}", plat, id_, None, "failed")
+        _posts_total.inc(platform=plat, status="failed")
+        release(id_)
+        return None
+    if not _take_capacity(id_, plat):
+        return None
+    start = time.monotonic()
+    try:
+        result = PUBLISHERS[plat](id_, txt)
+    except Exception as e:
+        elapsed = time.monotonic() - start
+        backoff = limiter.retry_after_error(plat, e)
+        if backoff:
+            backoff = _spread(plat, backoff)
+            defer(id_, backoff)
+            add_log(f"{plat} rate limited; {id_} deferred {backoff:.0f}s")
+            record("post", f"rate limited, deferred {backoff:.0f}s", plat, id_, elapsed, "deferred")
+            _observe(plat, "deferred", elapsed)
+        else:
+            add_log(f"Error posting to {plat}: {e}")
+            record("post", str(e), plat, id_, elapsed, "failed")
+            _observe(plat, "failed", elapsed)
+            release(id_)
+        return None
+    elapsed = time.monotonic() - start
+    if result is None:
+        record("post", "not published", plat, id_, elapsed, "failed")
+        _observe(plat, "failed", elapsed)
+        release(id_)
+        return None
+    permalink, label = result
+    post_status_writer.add((permalink, id_))
+    record("post", permalink or label, plat, id_, elapsed, "ok")
+    _observe(plat, "ok", elapsed)
+    return label
+
+
+def claim_due(worker=None, now=None, limit=None):
+    """Atomically claim up to ``limit`` due rows for ``worker``; [(id, platform, text)].
+
+    A row is claimable when nobody holds it or its lease expired (the
+    claimant died). The inner SELECT walks idx_posts_due.
+    """
+    now = int(now or time.time())
+    return execute_db_query(
+        "UPDATE posts SET claimed_by=?, lease_until=?, attempts=attempts+1 WHERE id IN ("
+        "  SELECT id FROM posts WHERE posted=0 AND due_at <= ? AND lease_until < ? AND attempts < ?"
+        "  ORDER BY due_at, id LIMIT ?"
+        ") RETURNING id, platform, text",
+        (worker or worker_id(), now + POST_LEASE_S, now, now, POST_MAX_ATTEMPTS, limit or POST_CLAIM_BATCH),
+        fetch=True
+    ) or []
+
+
+def renew_claims(worker=None):
+    """Extend the lease on every unsent row this worker holds"""
+    execute_db_query(
+        "UPDATE posts SET lease_until=? WHERE claimed_by=? AND posted=0 AND lease_until > 0",
+        (int(time.time()) + POST_LEASE_S, worker or worker_id())
+    )
+
+
+def _keep_claims(stop):
+    """Renew this worker's claims until ``stop`` is set and no sent row is still
+    waiting for its posted=1 write (otherwise its lease would lapse and
+    another tick would publish it again)"""
+    while not (stop.is_set() and not len(post_status_writer)):
+        if stop.is_set():
+            time.sleep(POST_LEASE_S / 3)  # tick is over; the write-behind timer is retrying
+        else:
+            stop.wait(POST_LEASE_S / 3)
+        try:
+            renew_claims()
+        except Exception as e:
+            add_log(f"Claim renewal error: {e}")
+
+
+def poster():
+    """One posting tick: fan due rows out to their platform queues and wait.
+
+    Rows are claimed first, so any number of workers can run this at once
+    and each post goes out once. Platforms drain concurrently, so catch-up
+    time grows with the slowest platform's backlog rather than with the
+    total number of posts. Returns the summary shown in the UI.
+    """
+    stop_renewal = threading.Event()
+    try:
+        rows = claim_due()
+        if not rows:
+            return "No scheduled posts to send right now."
+        if len(rows) >= POST_CLAIM_BATCH:
+            note_backlog()  # more due rows are waiting; run again right after this tick
+        threading.Thread(target=_keep_claims, args=(stop_renewal,), daemon=True).start()
+
+        futures = []
+        for id_, plat, txt in rows:
+            if plat not in PUBLISHERS:
+                add_log(f"Error posting to {plat}: unknown platform for {id_}")
+                release(id_)
+                continue
+            futures.append(platform_worker(plat).submit(publish, id_, plat, txt))
+
+        posted_platforms = set()
+        for future in as_completed(futures):
+            label = future.result()
+            if label:
+                posted_platforms.add(label)
+
+        # One commit for every row sent this tick
+        post_status_writer.flush()
+
+        if posted_platforms:
+            summary = f"✅ Finished posting to: {', '.join(sorted(posted_platforms))}"
+            add_log(summary)
+            return summary
+        return "No posts were ready to send."
+
+    except Exception as e:
+        error_msg = f"Error in poster function: {e}"
+        add_log(error_msg)
+        record("error", error_msg)
+        return f"❌ {error_msg}"
+    finally:
+        stop_renewal.set()
@@ -0,0 +1,80 @@
+# posts_view.py  – keyset-paginated, filtered pages of posts for the UI
+import threading
+from collections import OrderedDict
+from db import execute_db_query
+import metrics
+
+POSTS_PAGE_SIZE = 25
+PREVIEW_CHARS = 80
+PAGE_CACHE_SIZE = 64
+
+COLUMNS = ("id", "platform", "preview", "scheduled", "posted", "attempts", "permalink")
+STATUSES = {"pending": 0, "posted": 1}
+
+_cache = OrderedDict()  # (version, filters, cursor, limit) -> (rows, next_cursor)
+_cache_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0}
+metrics.collect("campaign_posts_page_cache_total", "Posts browser page cache lookups", lambda: cache_stats)
+
+
+def posts_version():
+    """Counter bumped by triggers on every posts write (see db migration v9)"""
+    rows = execute_db_query("SELECT version FROM table_versions WHERE name='posts'", fetch=True)
+    return rows[0][0] if rows else 0
+
+
+def _query(after, limit, platform, status, start, end):
+    where, params = [], []
+    if platform:
+        where.append("platform = ?")
+        params.append(platform)
+    if status in STATUSES:
+        where.append("posted = ?")
+        params.append(STATUSES[status])
+    if start is not None:
+        where.append("due_at >= ?")
+        params.append(int(start))
+    if end is not None:
+        where.append("due_at < ?")
+        params.append(int(end))
+    if after:
+        where.append("(due_at, id) > (?, ?)")
+        params.extend(after)
+    # Only a preview of the text is transferred; full_text() fetches one row on demand
+    query = (f"SELECT id, platform, substr(text, 1, {PREVIEW_CHARS}), scheduled, posted, attempts, "
+             "permalink, due_at FROM posts")
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    rows = execute_db_query(query + " ORDER BY due_at, id LIMIT ?", (*params, limit + 1), fetch=True) or []
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1][7], rows[-1][0]) if more else None
+    return [r[:7] for r in rows], next_cursor
+
+
+def page(after=None, limit=POSTS_PAGE_SIZE, platform=None, status=None, start=None, end=None):
+    """One page of posts ordered by (due_at, id), strictly after cursor ``after``.
+
+    Returns (rows, next_cursor). Pages are cached per posts_version(), so
+    any insert/update/delete (from this process or the worker) invalidates
+    them, while reruns and page flips without writes skip the query.
+    """
+    key = (posts_version(), platform, status, start, end, tuple(after) if after else None, limit)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            cache_stats["hits"] += 1
+            return hit
+        cache_stats["misses"] += 1
+    result = _query(after, limit, platform, status, start, end)
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > PAGE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def full_text(id_):
+    rows = execute_db_query("SELECT text FROM posts WHERE id=?", (id_,), fetch=True)
+    return rows[0][0] if rows else None
@@ -0,0 +1,129 @@
+# prefilter.py  – cheap local scoring that decides which comments are worth an LLM reply
+import json, math, os, re
+from collections import Counter
+from config import env_float, env_int
+
+PREFILTER_MIN_SCORE = env_float("PREFILTER_MIN_SCORE", 0.5)
+REPLY_MIN_CHARS = env_int("REPLY_MIN_CHARS", 12)
+LONG_COMMENT_CHARS = env_int("PREFILTER_LONG_CHARS", 2500)
+MODEL_FILE = os.getenv("PREFILTER_MODEL", "reply_model.json")
+MODEL_WEIGHT = 0.25           # how far the bag-of-words model can move the score
+
+BOT_AUTHORS = {"automoderator", "remindmebot", "savevideo", "sneakpeekbot", "repostsleuthbot"} | {
+    a.strip().lower() for a in os.getenv("REPLY_BOT_AUTHORS", "").split(",") if a.strip()
+}
+# Only separator forms ("bot_x", "x-bot", "x_bot2"); names like Talbot or
+# robot are real users, and known bots without a separator are in BOT_AUTHORS.
+_BOT_NAME = re.compile(r"(^bot[-_]|[-_]bot\d*$)", re.I)
+
+# Whole-comment acknowledgements that never need an answer
+_LOW_VALUE = re.compile(
+    r"^\W*(thanks?( you)?|thx|ty|lol+|lmao|nice|cool|great|awesome|this|same|\+1|agreed?|yes|no|ok(ay)?)\W*$", re.I
+)
+_HOSTILE = re.compile(
+    r"\b(spam(mer|ming)?|scam|shill(ing)?|self[- ]promo\w*|stop posting|f+u+c+k+ (off|you)|reported|go away|"
+    r"(you'?re|you are|are you|is this) a bot)\b", re.I
+)
+_INTEREST = re.compile(
+    r"(\?|\b(how|what|which|where|does it|can it|price|pricing|cost|free|download|link|app|tool|organi[sz]\w*|"
+    r"productiv\w*|todo|to-do|task|schedul\w*|planner|recommend\w*|try(ing)? it)\b)", re.I
+)
+_WORD = re.compile(r"[a-z']{2,}")
+
+
+def tokens(text):
+    return _WORD.findall(text.lower())
+
+
+class BagOfWords:
+    """Tiny multinomial naive Bayes (reply vs. don't) over lowercase words"""
+
+    def __init__(self, log_prior=0.0, log_ratio=None, default=0.0):
+        self.log_prior = log_prior
+        self.log_ratio = log_ratio or {}   # word -> log P(w|reply) - log P(w|skip)
+        self.default = default
+
+    @classmethod
+    def train(cls, samples, alpha=1.0):
+        """``samples``: iterable of (text, wanted: bool)"""
+        counts = {True: Counter(), False: Counter()}
+        docs = Counter()
+        for text, wanted in samples:
+            counts[bool(wanted)].update(tokens(text))
+            docs[bool(wanted)] += 1
+        vocab = set(counts[True]) | set(counts[False])
+        totals = {k: sum(c.values()) + alpha * (len(vocab) + 1) for k, c in counts.items()}
+        ratio = {w: math.log((counts[True][w] + alpha) / totals[True]) - math.log((counts[False][w] + alpha) / totals[False])
+                 for w in vocab}
+        prior = math.log((docs[True] + 1) / (docs[False] + 1))
+        return cls(prior, ratio, math.log(alpha / totals[True]) - math.log(alpha / totals[False]))
+
+    def probability(self, text):
+        logit = self.log_prior + sum(self.log_ratio.get(w, self.default) for w in tokens(text))
+        return 1 / (1 + math.exp(-max(-30.0, min(30.0, logit))))
+
+    def save(self, path=MODEL_FILE):
+        # Replaced atomically: running workers reload the file when it changes
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"log_prior": self.log_prior, "log_ratio": self.log_ratio, "default": self.default}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=MODEL_FILE):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(data.get("log_prior", 0.0), data.get("log_ratio"), data.get("default", 0.0))
+
+
+_model, _model_mtime = None, None
+
+
+def _current_model():
+    """The saved model, reloaded when MODEL_FILE changes (python -m campaign
+    train-filter) so running workers pick it up without a restart"""
+    global _model, _model_mtime
+    try:
+        mtime = os.stat(MODEL_FILE).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime != _model_mtime:
+        _model, _model_mtime = (BagOfWords.load() if mtime is not None else None), mtime
+    return _model
+
+
+def score(body, author=None, comment_score=None):
+    """(score in 0..1, reason). Comments scoring under PREFILTER_MIN_SCORE skip the LLM."""
+    name = (author or "").lower()
+    if not name or name in ("[deleted]", "[removed]"):
+        return 0.0, "deleted author"
+    if name in BOT_AUTHORS or _BOT_NAME.search(name):
+        return 0.0, "bot author"
+    text = (body or "").strip()
+    if text in ("[deleted]", "[removed]"):
+        return 0.0, "deleted comment"
+    if len(text) < REPLY_MIN_CHARS or _LOW_VALUE.match(text):
+        return 0.1, "too short / acknowledgement"
+    if _HOSTILE.search(text) or (comment_score is not None and comment_score < -2):
+        return 0.1, "hostile or downvoted"
+    # Substantive comments pass on their own; short ones need an interest signal
+    value, reason = (0.5, "substantive") if len(text) >= 40 else (0.4, "short")
+    if _INTEREST.search(text):
+        value, reason = 0.75, "question / interest"
+    if len(text) > LONG_COMMENT_CHARS:
+        value, reason = value - 0.2, reason + ", very long"
+    model = _current_model()
+    if model is not None:
+        value += MODEL_WEIGHT * (2 * model.probability(text) - 1)
+        reason += ", model"
+    return max(0.0, min(1.0, value)), reason
+
+
+def worth_replying(comment):
+    """(bool, score, reason) for a PRAW comment"""
+    author = getattr(comment.author, "name", None) if comment.author else None
+    value, reason = score(comment.body, author, getattr(comment, "score", None))
+    return value >= PREFILTER_MIN_SCORE, value, reason
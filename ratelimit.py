@@ -0,0 +1,248 @@
+# ratelimit.py  – token buckets per platform/account/action, fed by API headers
+import os, re, time, threading
+from config import TW_ACCESS, REDDIT_USER, env_float
+from db import execute_db_query
+from logs import add_log
+
+# "count/period_seconds[:burst]" per (platform, action); override with
+# RATE_LIMIT_<PLATFORM>_<ACTION>, e.g. RATE_LIMIT_REDDIT_REPLY="1/5:1"
+DEFAULT_LIMITS = {
+    ("x", "post"): "300/10800:5",       # v1.1 statuses/update window
+    ("reddit", "post"): "1/600:1",      # new-ish accounts get "doing that too much" fast
+    ("reddit", "reply"): "1/2:1",       # replaces the old fixed time.sleep(2)
+    ("linkedin", "post"): "150/86400:5",
+}
+FALLBACK_LIMIT = "60/60:5"
+
+# Waits up to this long are slept inside the platform worker; longer ones
+# push the post's due_at to the moment capacity frees up.
+INLINE_WAIT_S = env_float("RATE_LIMIT_INLINE_WAIT_S", 30)
+
+# PRAW's own pattern; matches both "try again in 9 minutes" and
+# "Take a break for 9 minutes before trying again"
+_REDDIT_WAIT = re.compile(r"(\d+) (milliseconds?|seconds?|minutes?|hours?)", re.I)
+_UNIT_S = {"millisecond": 0.001, "second": 1, "minute": 60, "hour": 3600}
+REDDIT_RATELIMIT_DEFAULT_S = 600  # RATELIMIT without a readable wait
+
+
+def parse_limit(spec):
+    """'count/period[:burst]' -> (tokens per second, capacity)"""
+    rate_part, _, burst = spec.partition(":")
+    count, _, period = rate_part.partition("/")
+    count, period = float(count), float(period or 1)
+    return count / period, float(burst) if burst else count
+
+
+def account_for(platform):
+    """Stable account label used to key buckets (no secrets)"""
+    if platform == "x":
+        return (TW_ACCESS or "default").split("-", 1)[0]  # access tokens start with the user id
+    if platform == "reddit":
+        return REDDIT_USER or "default"
+    return "default"
+
+
+# Refill, check and take in one statement, so concurrent workers can't both
+# spend the last token. SET expressions all see the old row; ``granted``
+# records whether this very update took a token.
+_REFILLED = "MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate)"
+_GRANT = f"(blocked_until <= :now AND {_REFILLED} >= 1)"
+_TAKE_SQL = (
+    f"UPDATE rate_buckets SET tokens = {_REFILLED} - {_GRANT}, granted = {_GRANT}, "
+    "updated_at = MAX(updated_at, :now) "
+    "WHERE platform=:platform AND account=:account AND action=:action "
+    "RETURNING granted, tokens, blocked_until"
+)
+
+
+class TokenBucket:
+    """One (platform, account, action) bucket. Its state lives in campaign.db
+    (rate_buckets, wall-clock seconds), so every worker process and host
+    sharing the database draws from the same tokens and sees the same blocks."""
+
+    def __init__(self, key, rate, capacity):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        execute_db_query(
+            "INSERT OR IGNORE INTO rate_buckets(platform, account, action, tokens, updated_at) VALUES(?,?,?,?,?)",
+            (*key, capacity, time.time())
+        )
+
+    def _params(self, **extra):
+        platform, account, action = self.key
+        return dict(platform=platform, account=account, action=action, rate=self.rate,
+                    capacity=self.capacity, now=time.time(), **extra)
+
+    def try_acquire(self):
+        """Take a token if one is free now; otherwise return the seconds until one is"""
+        params = self._params()
+        rows = execute_db_query(_TAKE_SQL, params, fetch=True)
+        if not rows:
+            return float("inf")
+        granted, tokens, blocked_until = rows[0]
+        if granted:
+            return 0.0
+        if blocked_until > params["now"]:
+            return blocked_until - params["now"]
+        return (1 - tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def block_for(self, seconds):
+        execute_db_query(
+            "UPDATE rate_buckets SET blocked_until = MAX(blocked_until, :now + :seconds) "
+            "WHERE platform=:platform AND account=:account AND action=:action",
+            self._params(seconds=seconds)
+        )
+
+    def sync_remaining(self, remaining, reset_in=None):
+        """Trust the server's count: never hold more tokens than it says are left"""
+        blocked = float(reset_in) if remaining < 1 and reset_in else 0.0
+        execute_db_query(
+            f"UPDATE rate_buckets SET tokens = MIN({_REFILLED}, :remaining), updated_at = MAX(updated_at, :now), "
+            "blocked_until = MAX(blocked_until, :now + :blocked) "
+            "WHERE platform=:platform AND account=:account AND action=:action",
+            self._params(remaining=float(remaining), blocked=blocked)
+        )
+
+
+class RateLimiter:
+    """Registry of buckets keyed by (platform, account, action); counters in
+    ``stats`` are per process, bucket state is shared through the database"""
+
+    def __init__(self, limits=DEFAULT_LIMITS):
+        self.limits = limits
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.stats = {"granted": 0, "waited": 0, "deferred": 0, "blocked_by_server": 0}
+
+    def _spec(self, platform, action):
+        env = os.getenv(f"RATE_LIMIT_{platform.upper()}_{action.upper()}")
+        return env or self.limits.get((platform, action), FALLBACK_LIMIT)
+
+    def bucket(self, platform, action, account=None):
+        key = (platform, account or account_for(platform), action)
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = TokenBucket(key, *parse_limit(self._spec(platform, action)))
+            return b
+
+    def _bump(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def try_acquire(self, platform, action, account=None):
+        """0 if the call may go now (token taken), else seconds until capacity frees up"""
+        wait = self.bucket(platform, action, account).try_acquire()
+        if wait <= 0:
+            self._bump("granted")
+        return wait
+
+    def acquire(self, platform, action, account=None, max_wait=None):
+        """Block until a token is free, sleeping exactly as long as needed.
+        Returns False (without a token) if that would exceed ``max_wait``."""
+        while True:
+            wait = self.try_acquire(platform, action, account)
+            if wait <= 0:
+                return True
+            if max_wait is not None and wait > max_wait:
+                return False
+            self._bump("waited")
+            time.sleep(wait)
+
+    def note_deferred(self):
+        self._bump("deferred")
+
+    # ---------- feedback from the platforms ----------
+    def observe_headers(self, platform, action, headers, account=None):
+        """Apply x-rate-limit-* / x-ratelimit-* / Retry-After response headers"""
+        if not headers:
+            return
+        from http_client import parse_retry_after  # requests stays out of the UI process
+        h = {k.lower(): v for k, v in dict(headers).items()}
+        retry_after = parse_retry_after(h.get("retry-after"))
+        if retry_after is not None:
+            self.block_account(platform, retry_after, account)
+        try:
+            remaining = h.get("x-rate-limit-remaining", h.get("x-ratelimit-remaining"))
+            if remaining is None:
+                return
+            reset_in = None
+            if "x-rate-limit-reset" in h:            # X: epoch seconds
+                reset_in = max(0.0, float(h["x-rate-limit-reset"]) - time.time())
+            elif "x-ratelimit-reset" in h:           # Reddit: seconds from now
+                reset_in = float(h["x-ratelimit-reset"])
+            remaining = float(remaining)
+        except ValueError:
+            add_log(f"Ignoring malformed {platform} rate-limit headers: {h}")
+            return
+        self.bucket(platform, action, account).sync_remaining(remaining, reset_in)
+
+    def observe_sent(self, observe, *args, **kwargs):
+        """Run an ``observe_*`` call for a request that already went out.
+
+        Errors (odd headers, a locked database) are logged, never raised: the
+        post or reply was published, and failing now would publish it again.
+        """
+        try:
+            observe(*args, **kwargs)
+        except Exception as e:
+            add_log(f"Rate-limit bookkeeping error (request already sent): {e}")
+
+    def observe_reddit(self, reddit, account=None):
+        """Feed PRAW's view of the per-account API budget after a call"""
+        limits = getattr(getattr(reddit, "auth", None), "limits", None) or {}
+        remaining, reset_at = limits.get("remaining"), limits.get("reset_timestamp")
+        if remaining is not None and remaining < 1 and reset_at:
+            self.block_account("reddit", max(0.0, reset_at - time.time()), account)
+
+    def block_account(self, platform, seconds, account=None):
+        """Server said stop: block every bucket of this account for ``seconds``"""
+        self._bump("blocked_by_server")
+        actions = {a for p, a in self.limits if p == platform} | {"post"}
+        for action in actions:
+            self.bucket(platform, action, account).block_for(seconds)
+
+    def retry_after_error(self, platform, exc, account=None):
+        """Seconds to back off for a rate-limit exception (and block the account), else None"""
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+        if status == 429:
+            h = {k.lower(): v for k, v in dict(getattr(response, "headers", None) or {}).items()}
+            if "x-rate-limit-reset" in h:
+                seconds = max(1.0, float(h["x-rate-limit-reset"]) - time.time())
+            else:
+                from http_client import parse_retry_after
+                seconds = parse_retry_after(h.get("retry-after"), 60.0)
+            self.block_account(platform, seconds, account)
+            return seconds
+        # PRAW: RedditAPIException.items -> RedditErrorItem(error_type, message, field)
+        messages = [getattr(item, "message", None) or str(item) for item in getattr(exc, "items", None) or []
+                    if getattr(item, "error_type", None) == "RATELIMIT"]
+        if not messages and "RATELIMIT" in str(exc).upper():
+            messages = [str(exc)]
+        if not messages:
+            return None
+        match = next((m for m in map(_REDDIT_WAIT.search, messages) if m), None)
+        seconds = (max(1.0, int(match.group(1)) * _UNIT_S[match.group(2).lower().rstrip("s")])
+                   if match else REDDIT_RATELIMIT_DEFAULT_S)
+        self.block_account(platform, seconds, account)
+        return seconds
+
+    def snapshot(self):
+        """Shared bucket state (tokens refilled to now) plus this process's counters"""
+        now = time.time()
+        with self._lock:
+            stats = dict(self.stats)
+        rows = []
+        for platform, account, action, tokens, updated_at, blocked_until in execute_db_query(
+                "SELECT platform, account, action, tokens, updated_at, blocked_until FROM rate_buckets "
+                "ORDER BY platform, account, action", fetch=True) or []:
+            rate, capacity = parse_limit(self._spec(platform, action))
+            rows.append({"platform": platform, "account": account, "action": action,
+                         "tokens": round(min(capacity, tokens + max(0.0, now - updated_at) * rate), 2),
+                         "capacity": capacity, "blocked_s": round(max(0.0, blocked_until - now), 1)})
+        return {"stats": stats, "buckets": rows}
+
+
+limiter = RateLimiter()
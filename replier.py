@@ -0,0 +1,255 @@
+# replier.py  – Reddit comment hunter
+import os, time
+from batch_replies import draft_stream
+from clients import client_registry
+from config import REDDIT_USER, PRODUCT_URL, env_float, env_int
+from db import execute_db_query
+from events import record
+from logs import add_log
+from prefilter import worth_replying
+from ratelimit import INLINE_WAIT_S, limiter
+from seen import seen_index
+
+# "inbox": read new top-level comments on our submissions from the inbox,
+# newest first, stopping at the stored cursor (API calls scale with new
+# activity). "scan": walk our latest submissions' comment trees.
+REPLIER_MODE = os.getenv("REPLIER_MODE", "inbox")
+REPLIER_INBOX_LIMIT = env_int("REPLIER_INBOX_LIMIT", 200)   # new inbox items handled per run, oldest first
+REPLIER_SUBMISSIONS = env_int("REPLIER_SUBMISSIONS", 10)    # scan mode: submissions walked
+REPLACE_MORE_LIMIT = env_int("REPLACE_MORE_LIMIT", 2)       # scan mode: MoreComments expanded per submission
+INBOX_CURSOR = "reddit:submission_replies"
+# Longest wait for a reply token; beyond it (account blocked by a RATELIMIT,
+# API budget spent) the run stops and the cursor stays for the next run.
+REPLY_MAX_WAIT_S = env_float("REPLY_MAX_WAIT_S", INLINE_WAIT_S)
+# Comments older than this are never answered (first run, long outages), and a
+# comment whose reply failed this many times is marked 'failed' and passed,
+# so one unanswerable comment can't hold the cursor back.
+REPLIER_MAX_AGE_S = env_float("REPLIER_MAX_AGE_S", 2 * 24 * 3600)
+REPLY_MAX_ATTEMPTS = env_int("REPLY_MAX_ATTEMPTS", 3)
+LABEL_MIN_AGE_S = env_float("LABEL_MIN_AGE_S", 2 * 24 * 3600)  # votes/answers settle before labelling
+# Reddit errors no retry can fix
+PERMANENT_ERRORS = {"THREAD_LOCKED", "TOO_OLD", "DELETED_COMMENT", "ARCHIVED", "BANNED_FROM_SUBREDDIT"}
+
+
+class RateLimited(Exception):
+    """Reddit wants us to stop replying for a while"""
+
+
+def _wants_reply(submission_id, comment):
+    """False (and marked) for our own comments, comments that already carry the
+    link, and anything the local prefilter scores as not worth an LLM call"""
+    if comment.author and comment.author.name == REDDIT_USER or PRODUCT_URL in comment.body:
+        seen_index.mark(comment.id, submission_id, comment.created_utc, "skipped")
+        return False
+    wanted, value, reason = worth_replying(comment)
+    if not wanted:
+        seen_index.mark(comment.id, submission_id, comment.created_utc, "filtered", comment.body)
+        record("reply", f"filtered ({reason}, {value:.2f})", platform="reddit", post_id=comment.id,
+               status="filtered")
+    return wanted
+
+
+def _send(comment_id, reply):
+    def send(reddit):
+        # Through the client passed in, so a rebuild after an auth error is used
+        sent = reddit.comment(comment_id).reply(reply)
+        limiter.observe_sent(limiter.observe_reddit, reddit)
+        return getattr(sent, "id", None)
+    return send
+
+
+def _submit(submission_id, comment, reply):
+    # Short waits are slept exactly; a longer block ends the run instead
+    if not limiter.acquire("reddit", "reply", max_wait=REPLY_MAX_WAIT_S):
+        raise RateLimited(f"reply capacity blocked for more than {REPLY_MAX_WAIT_S:.0f}s")
+    try:
+        reply_id = client_registry.call("reddit", _send(comment.id, reply))
+    except Exception as e:
+        backoff = limiter.retry_after_error("reddit", e)
+        if backoff:
+            raise RateLimited(f"Reddit rate limit, backing off {backoff:.0f}s") from e
+        raise
+    # Written now, not behind the buffer: a lost mark means a second public reply
+    seen_index.mark(comment.id, submission_id, comment.created_utc, "replied", comment.body, reply_id, sync=True)
+    add_log(f"Replied to Reddit comment {comment.id} on post {submission_id}")
+    record("reply", f"on post {submission_id}", platform="reddit", post_id=comment.id, status="ok")
+
+
+def _permanent(exc):
+    """True for a RedditAPIException carrying a PERMANENT_ERRORS item, or 403/404"""
+    if type(exc).__name__ in ("Forbidden", "NotFound"):
+        return True
+    return any(getattr(item, "error_type", None) in PERMANENT_ERRORS for item in getattr(exc, "items", None) or [])
+
+
+def _give_up(submission_id, comment, exc):
+    """Count a failed reply; True (comment marked 'failed') when it won't be retried"""
+    attempts = seen_index.note_failure(comment.id, exc)
+    if not _permanent(exc) and attempts < REPLY_MAX_ATTEMPTS:
+        return False
+    seen_index.mark(comment.id, submission_id, comment.created_utc, "failed", comment.body)
+    add_log(f"Giving up on Reddit comment {comment.id} after {attempts} attempt(s): {exc}")
+    return True
+
+
+def _floor(mark):
+    """Cursor / high-water mark, never older than REPLIER_MAX_AGE_S"""
+    return max(mark or 0.0, time.time() - REPLIER_MAX_AGE_S)
+
+
+def _handle(items, mark):
+    """Process (submission_id, comment) pairs oldest first; returns the new high-water mark.
+
+    Replies are drafted in concurrent batches (see batch_replies.py) while
+    this thread, the only submitter, posts them oldest first at the reply
+    rate limit. The mark only advances past a handled prefix, so a comment
+    whose draft or submit failed is picked up again next run, until it has
+    failed REPLY_MAX_ATTEMPTS times (or permanently). A rate limit stops the
+    batch: later comments wait for the next run.
+    """
+    items = sorted(items, key=lambda item: item[1].created_utc)
+    pending = {c.id: sid for sid, c in items if not seen_index.seen(c.id) and _wants_reply(sid, c)}
+    failed = set()
+    for comment, reply in draft_stream([c for _, c in items if c.id in pending]):
+        submission_id = pending[comment.id]
+        try:
+            if not reply:
+                raise ValueError("no reply drafted")
+            _submit(submission_id, comment, reply)
+        except RateLimited as e:
+            failed.add(comment.id)  # everything after it is newer, so the mark stops here
+            add_log(f"Comment replier stopped: {e}")
+            record("reply", str(e), platform="reddit", post_id=comment.id, status="deferred")
+            break
+        except Exception as e:
+            if not _give_up(submission_id, comment, e):
+                failed.add(comment.id)
+            record("reply", str(e), platform="reddit", post_id=comment.id, status="failed")
+    advance_to = mark
+    for _, comment in items:
+        if comment.id in failed:
+            return min(advance_to, comment.created_utc - 1e-3)  # same-second siblings stay visible
+        advance_to = comment.created_utc
+    return advance_to
+
+
+# --------------------------------------------------
+# HARVESTING  (Reddit calls go through client_registry.call: serialized with
+# posting on the shared client, rebuilt once on auth errors; drafting and
+# rate-limit waits happen outside the client lock)
+# --------------------------------------------------
+def _inbox_items(mark):
+    def fetch(reddit):
+        """(items newer than ``mark``, oldest first; whether the listing reached ``mark``)"""
+        items = []
+        # Listing is newest first and fetched page by page, so stopping at the
+        # cursor means only the pages holding new comments are requested.
+        for comment in reddit.inbox.submission_replies(limit=None):
+            if comment.created_utc <= mark:
+                return items[::-1], True
+            items.append((comment.link_id.split("_", 1)[-1], comment))
+        return items[::-1], False
+    return fetch
+
+
+def _harvest_inbox():
+    """New top-level comments on our submissions since the stored cursor.
+
+    Pages back to the cursor (at most REPLIER_MAX_AGE_S back, which is also
+    where the first run starts), then handles the oldest REPLIER_INBOX_LIMIT;
+    the cursor stops before the rest, which the next run picks up.
+    """
+    stored = seen_index.cursor(INBOX_CURSOR)
+    mark = _floor(stored)
+    items, reached = client_registry.call("reddit", _inbox_items(mark))
+    if stored and stored >= mark and not reached:
+        # Reddit listings end after ~1000 items; anything older is out of reach
+        add_log(f"Comment replier: inbox ended before the cursor; comments older than "
+                f"{items[0][1].created_utc if items else mark:.0f} were not seen")
+        record("reply", "inbox listing ended before the cursor", platform="reddit", status="gap")
+    batch, rest = items[:REPLIER_INBOX_LIMIT], items[REPLIER_INBOX_LIMIT:]
+    advance_to = _handle(batch, mark)
+    if rest:
+        advance_to = min(advance_to, rest[0][1].created_utc - 1e-3)  # same-second siblings stay visible
+    if advance_to > mark:
+        seen_index.set_cursor(INBOX_CURSOR, advance_to)
+    return len(items)
+
+
+def _post_items(submission_id, mark):
+    def fetch(reddit):
+        post = reddit.submission(submission_id)
+        # Expand at most REPLACE_MORE_LIMIT "load more" stubs; the rest are dropped
+        post.comments.replace_more(limit=REPLACE_MORE_LIMIT)
+        return [(submission_id, c) for c in post.comments
+                if type(c).__name__ != "MoreComments" and c.created_utc > mark]
+    return fetch
+
+
+def _harvest_scan():
+    """Top-level comments on our latest submissions, newer than each one's mark"""
+    count = 0
+    posts = client_registry.call(
+        "reddit", lambda reddit: list(reddit.user.me().submissions.new(limit=REPLIER_SUBMISSIONS)))
+    for post in posts:
+        mark = _floor(seen_index.high_water(post.id))
+        if post.num_comments == 0:
+            continue
+        items = client_registry.call("reddit", _post_items(post.id, mark))
+        count += len(items)
+        advance_to = _handle(items, mark)
+        if advance_to > mark:
+            seen_index.advance(post.id, advance_to)
+    return count
+
+
+def comment_replier():
+    """Reply to comments on our submissions that no run has handled yet"""
+    try:
+        harvest = _harvest_scan if REPLIER_MODE == "scan" else _harvest_inbox
+        found = harvest()
+        if found:
+            add_log(f"Comment replier: {found} new comments ({REPLIER_MODE})")
+    except Exception as e:
+        add_log(f"Error in comment_replier: {e}")
+        record("error", f"comment_replier: {e}", platform="reddit")
+    finally:
+        seen_index.flush()
+
+
+# --------------------------------------------------
+# RECEPTION LABELS  (prefilter training data the filter doesn't produce itself)
+# --------------------------------------------------
+def _reception(reply_id):
+    def fetch(reddit):
+        reply = reddit.comment(reply_id)
+        reply.refresh()
+        if reply.body in ("[removed]", "[deleted]") or reply.score < 1:
+            return 0      # removed by moderators or downvoted
+        if reply.score > 1 or len(reply.replies):
+            return 1      # upvoted or answered
+        return None       # no reaction either way
+    return fetch
+
+
+def label_replies(limit=100):
+    """Label replied comments older than LABEL_MIN_AGE_S by how our reply was received.
+    Each comment is checked once; returns (labelled, checked)."""
+    rows = execute_db_query(
+        "SELECT comment_id, reply_id FROM seen_comments WHERE action='replied' AND reply_id IS NOT NULL "
+        "AND label_source IS NULL AND seen_at < ? ORDER BY seen_at LIMIT ?",
+        (int(time.time() - LABEL_MIN_AGE_S), limit), fetch=True
+    ) or []
+    labelled = 0
+    for comment_id, reply_id in rows:
+        try:
+            label = client_registry.call("reddit", _reception(reply_id))
+        except Exception as e:
+            add_log(f"Reception check for {comment_id} failed: {e}")
+            continue
+        execute_db_query(
+            "UPDATE seen_comments SET label=?, label_source='reception' WHERE comment_id=? AND label_source IS NULL",
+            (label, comment_id)
+        )
+        labelled += label is not None
+    return labelled, len(rows)
@@ -0,0 +1,127 @@
+# router.py  – health-scored model routing with circuit breakers
+import time, threading
+from config import env_float, env_int
+from db import WriteBehindBuffer, execute_db_query
+
+BREAKER_THRESHOLD = env_int("LLM_BREAKER_THRESHOLD", 3)        # consecutive failures to open
+BREAKER_COOLDOWN_S = env_float("LLM_BREAKER_COOLDOWN_S", 60)    # first open; doubles per re-trip
+BREAKER_MAX_COOLDOWN_S = env_float("LLM_BREAKER_MAX_COOLDOWN_S", 6 * 3600)
+RATE_LIMIT_COOLDOWN_S = env_float("LLM_RATE_LIMIT_COOLDOWN_S", 30)  # after a 429
+LATENCY_PRIOR_S = 2.0   # assumed latency for models we haven't timed yet
+EWMA_ALPHA = 0.3
+
+FIELDS = ("successes", "failures", "consecutive_failures", "rate_limited",
+          "server_errors", "latency_ewma", "trips", "open_until")
+
+
+class ModelRouter:
+    """Per-model success rate, latency and 429/5xx counts with a circuit breaker.
+
+    Stats are loaded from ``model_health`` on first use and written back
+    through a write-behind buffer, so a restart keeps what was learned
+    (e.g. that a decommissioned model always 404s).
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._writer = WriteBehindBuffer(
+            "INSERT INTO model_health(model, " + ", ".join(FIELDS) + ", updated_at) "
+            "VALUES(?,?,?,?,?,?,?,?,?,?) ON CONFLICT(model) DO UPDATE SET "
+            + ", ".join(f"{f}=excluded.{f}" for f in FIELDS) + ", updated_at=excluded.updated_at",
+            max_items=50, max_age=5.0
+        )
+
+    # ---------- persistence ----------
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            rows = execute_db_query("SELECT model, " + ", ".join(FIELDS) + " FROM model_health", fetch=True)
+        except Exception as e:
+            print(f"Model health load error: {e}")
+            return
+        for row in rows or []:
+            self._stats[row[0]] = dict(zip(FIELDS, row[1:]))
+
+    def _persist(self, key, s):
+        self._writer.add((key, *(s[f] for f in FIELDS), int(time.time())))
+
+    def flush(self):
+        self._writer.flush()
+
+    # ---------- recording ----------
+    def _entry(self, key):
+        self._load()
+        s = self._stats.get(key)
+        if s is None:
+            s = self._stats[key] = dict.fromkeys(FIELDS, 0)
+            s["latency_ewma"] = None
+        return s
+
+    def record(self, provider, model, ok, latency_s=None, status=None):
+        """Feed back one attempt. ``status`` is the HTTP status (None for network errors)."""
+        key = f"{provider}:{model}"
+        now = time.time()
+        with self._lock:
+            s = self._entry(key)
+            if ok:
+                s["successes"] += 1
+                s["consecutive_failures"] = 0
+                s["trips"] = 0
+                s["open_until"] = 0
+                if latency_s is not None:
+                    prev = s["latency_ewma"]
+                    s["latency_ewma"] = latency_s if prev is None else EWMA_ALPHA * latency_s + (1 - EWMA_ALPHA) * prev
+            else:
+                s["failures"] += 1
+                s["consecutive_failures"] += 1
+                if status == 429:
+                    s["rate_limited"] += 1
+                    s["open_until"] = max(s["open_until"], int(now + RATE_LIMIT_COOLDOWN_S))
+                elif status is not None and status >= 500:
+                    s["server_errors"] += 1
+                if s["consecutive_failures"] >= BREAKER_THRESHOLD:
+                    # Open (or re-open after a failed half-open trial) with backoff
+                    cooldown = min(BREAKER_COOLDOWN_S * (2 ** s["trips"]), BREAKER_MAX_COOLDOWN_S)
+                    s["trips"] += 1
+                    s["open_until"] = max(s["open_until"], int(now + cooldown))
+            self._persist(key, s)
+
+    # ---------- routing ----------
+    def _expected_cost(self, s):
+        latency = s["latency_ewma"] if s["latency_ewma"] is not None else LATENCY_PRIOR_S
+        success_rate = (s["successes"] + 1) / (s["successes"] + s["failures"] + 2)
+        return latency / max(success_rate, 0.05)
+
+    def order(self, candidates):
+        """Drop candidates with an open breaker and sort the rest by expected latency.
+
+        Once a breaker's cooldown passes the model is eligible again for a
+        half-open trial. If every breaker is open, all candidates are returned
+        (soonest to close first) rather than failing outright.
+        """
+        now = time.time()
+        with self._lock:
+            scored = [(c, self._entry(f"{c[0]}:{c[1]}")) for c in candidates]
+            closed = [(self._expected_cost(s), i, c) for i, (c, s) in enumerate(scored) if s["open_until"] <= now]
+            if closed:
+                return [c for _, _, c in sorted(closed)]
+            return [c for _, _, c in sorted((s["open_until"], i, c) for i, (c, s) in enumerate(scored))]
+
+
+router = ModelRouter()
+
+
+def stored_health():
+    """One dict per model with breaker state, read fresh from ``model_health``.
+    For the UI: the workers do the routing, so this process's router never
+    sees their calls."""
+    now = time.time()
+    rows = execute_db_query("SELECT model, " + ", ".join(FIELDS) + " FROM model_health ORDER BY model",
+                            fetch=True) or []
+    return [dict(model=model, **dict(zip(FIELDS, values)),
+                 breaker="open" if (values[-1] or 0) > now else "closed")
+            for model, *values in rows]
@@ -0,0 +1,207 @@
+# scheduler.py  – event-driven scheduler: sleep until the next due post or timer
+import heapq, itertools, time, threading
+from config import POST_MAX_ATTEMPTS, env_float, env_int
+from db import execute_db_query
+from events import record
+from logs import add_log
+import metrics
+
+REPLIER_INTERVAL_S = env_float("REPLIER_INTERVAL_S", 600)
+SCHEDULER_WATCH_S = env_float("SCHEDULER_WATCH_S", 5)      # cheap posts-version check
+SCHEDULER_MAX_IDLE_S = env_float("SCHEDULER_MAX_IDLE_S", 3600)
+DUE_PREFETCH = env_int("SCHEDULER_DUE_PREFETCH", 64)       # due times held in the heap
+POSTER_RETRY_S = env_float("POSTER_RETRY_S", 60)           # rows left unsent by a run wait this long
+
+POSTS = "posts"
+
+_tick_seconds = metrics.histogram("campaign_scheduler_tick_seconds", "Duration of scheduler jobs (poster run, timers)",
+                                  ("job",))
+
+_instances = set()
+_instances_lock = threading.Lock()
+_tick = threading.local()
+
+
+def wake():
+    """Tell every scheduler in this process that posts changed (new rows, reschedules).
+    Other processes notice through the posts version within SCHEDULER_WATCH_S."""
+    with _instances_lock:
+        instances = list(_instances)
+    for s in instances:
+        s.wake()
+
+
+def note_backlog():
+    """Called by the poster when it claimed a full batch: the scheduler whose
+    tick is running on this thread runs the poster again straight away
+    instead of treating the leftover due rows as retries."""
+    _tick.backlog = True
+
+
+class EventScheduler:
+    """Min-heap of upcoming due times plus recurring timers.
+
+    The loop sleeps until the earliest heap entry instead of polling. Post
+    due times come from the partial due index; the heap is reloaded when
+    someone calls ``wake()`` or the posts version (bumped by triggers on
+    every posts write, see db migration v9) changes; commits to other tables
+    (lease heartbeats, events) don't cause reloads.
+    Timers (the comment replier) run on their own interval, each on a
+    short-lived thread so a slow run never delays posting.
+    """
+
+    def __init__(self, poster, timers=()):
+        self.poster = poster
+        self._heap = []                 # (run_at, seq, kind)
+        self._seq = itertools.count()
+        self._timers = {}               # name -> (interval, fn)
+        self._cond = threading.Condition()
+        self._dirty = True
+        self._stop = threading.Event()
+        self._posts_version = None
+        self._last_post_run = 0.0
+        self._backlog = False           # last poster run claimed a full batch
+        self._timer_threads = set()     # timer runs in flight
+        self.stats = {"ticks": 0, "post_runs": 0, "timer_runs": 0, "reloads": 0, "wakeups": 0}
+        for name, interval, fn in timers:
+            self.add_timer(name, interval, fn)
+
+    # ---------- control ----------
+    def add_timer(self, name, interval, fn):
+        with self._cond:
+            self._timers[name] = (interval, fn)
+            heapq.heappush(self._heap, (time.time() + interval, next(self._seq), name))
+            self._cond.notify()
+
+    def wake(self):
+        with self._cond:
+            self._dirty = True
+            self.stats["wakeups"] += 1
+            self._cond.notify()
+
+    def stop(self):
+        self._stop.set()
+        self.wake()
+
+    # ---------- heap maintenance ----------
+    def _external_change(self):
+        """True when any connection wrote to posts since the last check"""
+        try:
+            rows = execute_db_query("SELECT version FROM table_versions WHERE name='posts'", fetch=True)
+        except Exception:
+            return False
+        version = rows[0][0] if rows else 0
+        changed = self._posts_version is not None and version != self._posts_version
+        self._posts_version = version
+        return changed
+
+    def _reload_due(self):
+        """Replace the heap's post entries with the next times a row becomes claimable"""
+        # Same filter as posting.claim_due: rows out of attempts are never
+        # scheduled, and a row held by a live claim counts from its expiry.
+        rows = execute_db_query(
+            "SELECT due_at, lease_until, attempts FROM posts WHERE posted=0 AND due_at IS NOT NULL AND attempts < ? "
+            "ORDER BY due_at LIMIT ?", (POST_MAX_ATTEMPTS, DUE_PREFETCH), fetch=True
+        ) or []
+        # Rows a run already tried (attempts > 0: errors, missing subreddit)
+        # and that are still unsent are retried after POSTER_RETRY_S rather
+        # than spinning the loop; their attempts run out eventually. Rows
+        # nobody tried yet, e.g. inserted while the last run was going, are
+        # due straight away even if their due time is before that run.
+        retry_at = self._last_post_run + POSTER_RETRY_S
+        times = set()
+        for due_at, lease, attempts in rows:
+            t = max(due_at, lease + 1 if lease else 0)  # a live claim counts from its expiry
+            times.add(retry_at if attempts and t <= self._last_post_run else t)
+        with self._cond:
+            self._heap = [e for e in self._heap if e[2] != POSTS]
+            for due_at in sorted(times):
+                self._heap.append((due_at, next(self._seq), POSTS))
+            if self._backlog:
+                self._heap.append((time.time(), next(self._seq), POSTS))
+                self._backlog = False
+            heapq.heapify(self._heap)
+            self._dirty = False
+            self.stats["reloads"] += 1
+
+    # ---------- loop ----------
+    def run(self):
+        with _instances_lock:
+            _instances.add(self)
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._step()
+                except Exception as e:
+                    add_log(f"Scheduler error: {e}")
+                    record("error", f"scheduler: {e}")
+                    self._stop.wait(60)  # Wait longer on error
+        finally:
+            with _instances_lock:
+                _instances.discard(self)
+
+    def _step(self):
+        if self._dirty or self._external_change():
+            self._reload_due()
+        with self._cond:
+            now = time.time()
+            next_at = self._heap[0][0] if self._heap else now + SCHEDULER_MAX_IDLE_S
+            if next_at > now:
+                # Sleep until the earliest entry, checking the posts version meanwhile
+                self._cond.wait(min(next_at - now, SCHEDULER_WATCH_S, SCHEDULER_MAX_IDLE_S))
+                return
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+        self.stats["ticks"] += 1
+        if POSTS in due:
+            self.stats["post_runs"] += 1
+            self._last_post_run = now
+            _tick.backlog = False
+            with _tick_seconds.time(job=POSTS):
+                self.poster()
+            with self._cond:
+                self._dirty = True  # rows were sent or deferred
+                self._backlog = _tick.backlog
+        for name in dict.fromkeys(d for d in due if d != POSTS):
+            self.stats["timer_runs"] += 1
+            # Timers (the replier can wait on Reddit) never hold up due posts
+            thread = threading.Thread(target=self._run_timer, args=(name,), name=f"timer-{name}", daemon=True)
+            with self._cond:
+                self._timer_threads.add(thread)
+            thread.start()
+
+    def join_timers(self, timeout=None):
+        """Wait for timer runs in flight (a replier between reply() and its
+        seen-mark), at most ``timeout`` seconds in total; True if all ended"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            threads = list(self._timer_threads)
+        for thread in threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(t.is_alive() for t in threads)
+
+    def _run_timer(self, name):
+        """One timer run off the scheduler thread; the next run is queued when it ends,
+        so a timer never overlaps itself"""
+        interval, fn = self._timers[name]
+        try:
+            with _tick_seconds.time(job=name):
+                fn()
+        except Exception as e:
+            add_log(f"Scheduler timer {name} error: {e}")
+            record("error", f"scheduler timer {name}: {e}")
+        finally:
+            with self._cond:
+                self._timer_threads.discard(threading.current_thread())
+                heapq.heappush(self._heap, (time.time() + interval, next(self._seq), name))
+                self._cond.notify()
+
+
+def start_background(poster, comment_replier=None):
+    """Run an EventScheduler with the poster (and replier, if given) on a daemon thread"""
+    timers = [("comment_replier", REPLIER_INTERVAL_S, comment_replier)] if comment_replier else []
+    scheduler = EventScheduler(poster, timers=timers)
+    thread = threading.Thread(target=scheduler.run, name="event-scheduler", daemon=True)
+    thread.start()
+    return scheduler, thread
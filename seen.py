@@ -0,0 +1,149 @@
+# seen.py  – which Reddit comments the replier already handled (Bloom filter + SQLite)
+import atexit, hashlib, math, threading, time
+from config import env_int
+from db import WriteBehindBuffer, execute_db_query
+import metrics
+
+SEEN_BLOOM_CAPACITY = env_int("SEEN_BLOOM_CAPACITY", 100_000)
+SEEN_BLOOM_ERROR = 0.01
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one sha256)"""
+
+    def __init__(self, capacity, error_rate=SEEN_BLOOM_ERROR):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:16], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class SeenIndex:
+    """Persistent set of handled comment ids with an in-memory Bloom filter in front.
+
+    A Bloom miss means "new" without touching SQLite; only possible hits are
+    confirmed with a primary-key lookup. Marks are batched and flushed at
+    the end of each replier run. Per-submission high-water marks let a run
+    skip every comment at or before the last fully handled created_utc.
+    ``sync=True`` writes a mark before returning (used for sent replies,
+    which no claim lease protects from being sent twice).
+    """
+
+    def __init__(self, capacity=SEEN_BLOOM_CAPACITY):
+        self.capacity = capacity
+        self._bloom = None
+        self._lock = threading.Lock()
+        self._writer = WriteBehindBuffer(
+            "INSERT OR REPLACE INTO seen_comments(comment_id, submission_id, created_utc, action, seen_at, body, reply_id) "
+            "VALUES(?,?,?,?,?,?,?)", max_items=200, max_age=5.0
+        )
+        self.stats = {"bloom_negative": 0, "db_checks": 0, "false_positives": 0, "marked": 0}
+
+    def _load(self):
+        """Build the filter from the table (sized for growth) on first use"""
+        if self._bloom is None:
+            self._writer.flush()
+            ids = [r[0] for r in execute_db_query("SELECT comment_id FROM seen_comments", fetch=True) or []]
+            bloom = BloomFilter(max(self.capacity, 2 * len(ids)))
+            for comment_id in ids:
+                bloom.add(comment_id)
+            self._bloom = bloom
+        return self._bloom
+
+    def seen(self, comment_id):
+        with self._lock:
+            if comment_id not in self._load():
+                self.stats["bloom_negative"] += 1
+                return False
+            self.stats["db_checks"] += 1
+        self._writer.flush()  # a mark from this run may still be buffered
+        found = bool(execute_db_query(
+            "SELECT 1 FROM seen_comments WHERE comment_id=?", (comment_id,), fetch=True
+        ))
+        if not found:
+            with self._lock:
+                self.stats["false_positives"] += 1
+        return found
+
+    def mark(self, comment_id, submission_id=None, created_utc=None, action="replied", body=None, reply_id=None,
+             sync=False):
+        with self._lock:
+            bloom = self._load()
+            bloom.add(comment_id)
+            if bloom.count > bloom.capacity:
+                self._bloom = None  # rebuilt, twice as large, on next use
+            self.stats["marked"] += 1
+        self._writer.add((comment_id, submission_id, created_utc, action, int(time.time()),
+                          body[:500] if body else None, reply_id))
+        if sync:
+            self._writer.flush()
+
+    def flush(self):
+        self._writer.flush()
+
+    def note_failure(self, comment_id, error):
+        """Count one failed reply attempt; returns the attempts so far"""
+        rows = execute_db_query(
+            "INSERT INTO reply_attempts(comment_id, attempts, last_error, updated_at) VALUES(?,1,?,?) "
+            "ON CONFLICT(comment_id) DO UPDATE SET attempts=attempts+1, last_error=excluded.last_error, "
+            "updated_at=excluded.updated_at RETURNING attempts",
+            (comment_id, str(error)[:500], int(time.time())), fetch=True
+        )
+        return rows[0][0] if rows else 1
+
+    # ---------- training labels (see campaign.py train-filter) ----------
+    def label(self, comment_id, wanted, source="hand"):
+        """Set a comment's training label; False if the comment isn't known"""
+        self._writer.flush()
+        rows = execute_db_query(
+            "UPDATE seen_comments SET label=?, label_source=? WHERE comment_id=? RETURNING comment_id",
+            (int(bool(wanted)), source, comment_id), fetch=True
+        )
+        return bool(rows)
+
+    # ---------- per-submission high-water marks ----------
+    def high_water(self, submission_id):
+        rows = execute_db_query(
+            "SELECT last_created_utc FROM submission_marks WHERE submission_id=?", (submission_id,), fetch=True
+        )
+        return rows[0][0] if rows else 0.0
+
+    def advance(self, submission_id, created_utc):
+        execute_db_query(
+            "INSERT INTO submission_marks(submission_id, last_created_utc, updated_at) VALUES(?,?,?) "
+            "ON CONFLICT(submission_id) DO UPDATE SET last_created_utc=MAX(last_created_utc, excluded.last_created_utc), "
+            "updated_at=excluded.updated_at",
+            (submission_id, created_utc, int(time.time()))
+        )
+
+    # ---------- named cursors (inbox harvesting) ----------
+    def cursor(self, name):
+        rows = execute_db_query("SELECT value FROM cursors WHERE name=?", (name,), fetch=True)
+        return rows[0][0] if rows else None
+
+    def set_cursor(self, name, value):
+        execute_db_query(
+            "INSERT INTO cursors(name, value, updated_at) VALUES(?,?,?) "
+            "ON CONFLICT(name) DO UPDATE SET value=MAX(value, excluded.value), updated_at=excluded.updated_at",
+            (name, value, int(time.time()))
+        )
+
+
+seen_index = SeenIndex()
+atexit.register(seen_index.flush)
+metrics.collect("campaign_seen_lookups_total", "Seen-comment index lookups (Bloom negatives, DB checks, false positives)",
+                lambda: seen_index.stats, label="stat")
@@ -0,0 +1,41 @@
+# startup.py  – cold-start and rerun timing for the Streamlit app
+import threading, time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_imports = {}            # label -> seconds, first (cold) import only
+_render = {"first_render_s": None, "last_rerun_s": None, "reruns": 0, "slowest_rerun_s": 0.0}
+
+
+@contextmanager
+def timed(label):
+    """Time a block of imports/initialization; only the first (cold) run is kept.
+    Later reruns find the modules in sys.modules and cost next to nothing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _imports.setdefault(label, elapsed)
+
+
+def rendered(started):
+    """Record one script run that began at ``started`` (time.perf_counter())"""
+    elapsed = time.perf_counter() - started
+    with _lock:
+        if _render["first_render_s"] is None:
+            _render["first_render_s"] = elapsed
+        _render["last_rerun_s"] = elapsed
+        _render["reruns"] += 1
+        _render["slowest_rerun_s"] = max(_render["slowest_rerun_s"], elapsed)
+
+
+def report():
+    """Import cost per section (slowest first) plus render latencies, in seconds"""
+    with _lock:
+        imports = dict(sorted(_imports.items(), key=lambda kv: kv[1], reverse=True))
+        render = dict(_render)
+    rounded = {k: round(v, 4) for k, v in imports.items()}
+    return dict({k: (round(v, 4) if isinstance(v, float) else v) for k, v in render.items()},
+                imports_s=rounded, imports_total_s=round(sum(imports.values()), 4))
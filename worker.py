@@ -0,0 +1,239 @@
+# worker.py  – headless worker: event scheduler + command queue, independent of Streamlit
+import os, threading, time
+from config import env_float
+from db import init_database, post_status_writer
+from events import event_writer, prune as prune_events, record
+from logs import add_log
+from lease import Lease, LEASE_HEARTBEAT_S, worker_id
+import commands
+import metrics
+
+COMMAND_POLL_S = env_float("COMMAND_POLL_S", 1.0)  # how quickly UI commands are picked up
+EVENTS_PRUNE_INTERVAL_S = env_float("EVENTS_PRUNE_INTERVAL_S", 3600)
+WORKER_STOP_TIMEOUT_S = env_float("WORKER_STOP_TIMEOUT_S", 30)  # wait for a running tick on shutdown
+
+
+# --------------------------------------------------
+# COMMAND HANDLERS  (heavy modules imported on first use)
+# --------------------------------------------------
+def _generate(id_, fresh=False):
+    from generation import generate_posts
+
+    def progress(done, total, queued):
+        commands.set_progress(id_, f"{done}/{total} generated · {queued} queued")
+
+    queued, failed = generate_posts(on_progress=progress, fresh=fresh)
+    add_log(f"Generation: {queued} posts queued, {failed} failed")
+    return f"Posts queued! ({queued})" + (f" · {failed} entries got no usable text" if failed else "")
+
+
+def _post_now(id_):
+    from posting import poster
+    return poster()
+
+
+def _reply_now(id_):
+    from replier import comment_replier
+    comment_replier()
+    return "Comment replier run finished"
+
+
+HANDLERS = {"generate": _generate, "post_now": _post_now, "reply_now": _reply_now}
+
+
+SCHEDULER_LEASE = "scheduler"
+
+
+class Worker:
+    """Runs the EventScheduler and executes commands queued in campaign.db.
+
+    The Streamlit app only reads state and enqueues commands, so browser
+    sessions and reruns never own a scheduler thread. Only the holder of the
+    "scheduler" lease runs the replier and commands; other workers wait as
+    observers and take over when the leader stops heartbeating. With
+    ``drain=True`` an observer still publishes due posts (rows are claimed,
+    so workers never send the same post twice). The leader also trims old
+    events every EVENTS_PRUNE_INTERVAL_S. Metrics are written to this
+    worker's own textfile (``metrics.textfile_for``, removed on stop) and
+    served on METRICS_PORT when set while it runs.
+    """
+
+    def __init__(self, scheduler=True, poll=COMMAND_POLL_S, drain=False):
+        self.id = worker_id()
+        self.metrics_file = metrics.textfile_for(self.id)
+        self.with_scheduler = scheduler
+        self.drain = drain
+        self.poll = poll
+        self.scheduler = None
+        self._scheduler_thread = None
+        self._scheduler_lock = threading.RLock()  # the heartbeat thread stops it too
+        self.lease = Lease(SCHEDULER_LEASE, self.id, on_lost=self._lease_lost)
+        # Live while this process runs: a new leader only fails the commands
+        # of workers whose presence lease has run out (see commands.fail_interrupted)
+        self.presence = Lease(f"worker:{self.id}", self.id)
+        self._stop = threading.Event()
+        self._next_prune = 0.0
+        self.stats = {"commands": 0, "failed": 0, "started_at": None}
+
+    def stop(self):
+        self._stop.set()
+
+    def _start_scheduler(self, replier=True):
+        from posting import poster
+        from replier import comment_replier
+        from scheduler import start_background
+        with self._scheduler_lock:
+            self._stop_scheduler()
+            if replier and not self.lease.held:
+                return  # lost between the check and here; _lease_lost already ran
+            self.scheduler, self._scheduler_thread = start_background(poster, comment_replier if replier else None)
+
+    def _stop_scheduler(self, timeout=None):
+        """Stop the scheduler; with ``timeout``, wait up to that long for a running
+        tick and any timer run (the replier) to end"""
+        with self._scheduler_lock:
+            scheduler, thread = self.scheduler, self._scheduler_thread
+            self.scheduler = self._scheduler_thread = None
+        if scheduler:
+            scheduler.stop()
+            if timeout:
+                deadline = time.monotonic() + timeout
+                thread.join(timeout=timeout)
+                if not scheduler.join_timers(max(0.0, deadline - time.monotonic())):
+                    add_log(f"Worker {self.id}: a timer run was still going after {timeout:.0f}s")
+
+    def _lease_lost(self):
+        """Lease thread: the lease was taken or ran out on our clock. Stop the
+        leader's scheduler now, not when the command loop next looks (a generate
+        command can run for minutes), so two repliers never run at once."""
+        self._stop_scheduler()
+        add_log(f"Worker {self.id} no longer holds the scheduler lease; scheduler stopped")
+
+    def _lead(self):
+        """Called when this worker becomes leader"""
+        commands.fail_interrupted()  # left 'running' by the previous leader
+        if self.with_scheduler:
+            self._start_scheduler()
+        add_log(f"Worker {self.id} is now the scheduler leader")
+
+    def _maybe_prune(self):
+        """Trim the events table past EVENTS_RETENTION_S, at most once per interval"""
+        if time.time() < self._next_prune:
+            return
+        self._next_prune = time.time() + EVENTS_PRUNE_INTERVAL_S
+        try:
+            deleted = prune_events()
+        except Exception as e:
+            add_log(f"Event pruning error: {e}")
+            return
+        if deleted:
+            add_log(f"Pruned {deleted} old events")
+
+    def run_command(self, id_, command, args):
+        handler = HANDLERS.get(command)
+        self.stats["commands"] += 1
+        start = time.monotonic()
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown command: {command}")
+            result = handler(id_, **args)
+            commands.finish(id_, result)
+            record("command", result, post_id=f"{command}#{id_}", latency_s=time.monotonic() - start, status="ok")
+        except Exception as e:
+            self.stats["failed"] += 1
+            add_log(f"Command {command} #{id_} failed: {e}")
+            commands.finish(id_, str(e), ok=False)
+            record("command", str(e), post_id=f"{command}#{id_}", latency_s=time.monotonic() - start,
+                   status="failed")
+
+    def run(self):
+        if not init_database():
+            raise RuntimeError("Database initialization failed")
+        self.stats["started_at"] = time.time()
+        self.presence.try_acquire()
+        presence = self.presence.start(self._stop)
+        self.lease.try_acquire()
+        heartbeat = self.lease.start(self._stop)
+        try:
+            exporter = metrics.start_exporter(self._stop, path=self.metrics_file)
+        except OSError as e:  # port taken (e.g. a second worker on this host): textfile only
+            add_log(f"Metrics endpoint unavailable ({e}); writing {self.metrics_file} only")
+            exporter = metrics.start_exporter(self._stop, path=self.metrics_file, port=0)
+        add_log(f"Worker {self.id} started" + ("" if self.lease.held else " as observer"))
+        if self.drain and self.with_scheduler and not self.lease.held:
+            self._start_scheduler(replier=False)
+        leading = False
+        try:
+            while not self._stop.is_set():
+                if self.lease.held != leading:
+                    leading = self.lease.held
+                    if leading:
+                        self._lead()
+                    else:
+                        self._stop_scheduler()
+                        if self.drain and self.with_scheduler:
+                            self._start_scheduler(replier=False)
+                        add_log(f"Worker {self.id} lost the scheduler lease; observing")
+                if not leading:
+                    self._stop.wait(LEASE_HEARTBEAT_S)
+                    continue
+                self._maybe_prune()
+                try:
+                    claimed = commands.claim_next(self.id)
+                except Exception as e:
+                    add_log(f"Worker error: {e}")
+                    claimed = None
+                if claimed:
+                    self.run_command(*claimed)
+                    continue  # drain the queue before sleeping
+                self._stop.wait(self.poll)
+        finally:
+            self._stop.set()
+            self._stop_scheduler(timeout=WORKER_STOP_TIMEOUT_S)  # let a poster tick and the replier finish
+            heartbeat.join(timeout=5)  # no renewal may land after the release
+            presence.join(timeout=5)
+            # Sent posts and replies must be on disk before another worker can
+            # claim the rows, or they would be published twice
+            from seen import seen_index
+            for writer in (post_status_writer, seen_index):
+                try:
+                    writer.flush()
+                except Exception as e:  # rows stay buffered; atexit retries them
+                    add_log(f"Worker {self.id} shutdown flush error: {e}")
+            self.lease.release()  # observers take over on their next heartbeat
+            self.presence.release()
+            event_writer.flush()
+            from router import router
+            router.flush()  # model health learned this run
+            exporter.join(timeout=5)
+            try:
+                os.remove(self.metrics_file)  # a stopped worker has nothing current to show
+            except OSError:
+                pass
+            add_log(f"Worker {self.id} stopped")
+
+
+_in_process = None  # (Worker, thread)
+_in_process_lock = threading.Lock()
+
+
+def _run_logged(w):
+    try:
+        w.run()
+    except Exception as e:
+        add_log(f"Worker {w.id} failed: {e}")
+        raise
+
+
+def start_background():
+    """Run a Worker on a daemon thread in this process (single-process deployments).
+    Returns the existing one if it is still running; one that exited (e.g. the
+    database failed to initialize) is replaced."""
+    global _in_process
+    with _in_process_lock:
+        if _in_process is None or not _in_process[1].is_alive():
+            w = Worker()
+            thread = threading.Thread(target=_run_logged, args=(w,), name="campaign-worker", daemon=True)
+            thread.start()
+            _in_process = (w, thread)
+        return _in_process[0]